@@ -0,0 +1,75 @@
+"""
+Engine benchmarks.
+
+    python -m benchmarks run --save benchmarks/baselines/main.json
+    python -m benchmarks compare benchmarks/baselines/main.json --threshold 0.1
+    python -m benchmarks imports
+"""
+import argparse
+import sys
+
+from benchmarks import imports, suite
+
+# Time spent in the engine's own modules when a grading worker loads the interpreter, the standard library excluded
+IMPORT_BUDGET_MS = 20.0
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def print_results(current: dict, baseline: dict | None = None):
+    for name, seconds in current["results"].items():
+        line = f"{name:<32} {format_seconds(seconds)}"
+        if baseline and name in baseline["results"]:
+            line += f"  {seconds / baseline['results'][name] - 1:+7.1%}"
+        print(line)
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    subparsers = arg_parser.add_subparsers(dest="mode", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--save", help="write the results to this JSON file")
+
+    compare_parser = subparsers.add_parser("compare", help="run the benchmarks and compare them to a baseline")
+    compare_parser.add_argument("baseline", help="JSON file written by run --save")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+        subparser.add_argument("--repeat", type=int, default=5)
+
+    imports_parser = subparsers.add_parser("imports", help="check the import time of the engine")
+    imports_parser.add_argument("--module", default="game.coding.program")
+    imports_parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+
+    args = arg_parser.parse_args(argv)
+    if args.mode == "imports":
+        problems = imports.check(args.module, args.budget_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        return 1 if problems else 0
+
+    current = suite.run(args.filter, args.repeat)
+
+    if args.mode == "run":
+        print_results(current)
+        if args.save:
+            suite.save(args.save, current)
+        return 0
+
+    baseline = suite.load(args.baseline)
+    print_results(current, baseline)
+    regressions = suite.compare(baseline, current, args.threshold)
+    for name, before, after, change in regressions:
+        print(f"REGRESSION {name}: {format_seconds(before)} -> {format_seconds(after)} ({change:+.1%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Scalar interpreter against the NumPy lockstep engine, on one board. Needs NumPy.
+
+    python -m benchmarks.batch
+"""
+import time
+
+from benchmarks.generators import make_board, make_loop_program, make_program
+from game.board import Board
+from game.coding.batch import run_batch
+from game.coding.program import CompiledProgram, Parser, Program
+from game.robot_game import RobotEntity, RobotGame
+
+BATCH_SIZES = (10, 100, 1000)
+STEP_BUDGET = 1000
+
+
+def make_programs(count: int) -> list[CompiledProgram]:
+    """Half endless loops that use the whole budget, half random programs that mostly crash early"""
+    programs = []
+    for i in range(count):
+        source = make_loop_program(5 + i % 20) if i % 2 else make_program(20, seed=i)
+        programs.append(CompiledProgram.from_source(Parser(source).parse()))
+    return programs
+
+
+def run_scalar(programs: list[CompiledProgram], board: Board) -> int:
+    steps = 0
+    for compiled in programs:
+        game = RobotGame("bench", board, RobotEntity(board), "bench")
+        steps += Program(compiled, None).run(game, "bench", step_budget=STEP_BUDGET, detect_loops=False).duration
+    return steps
+
+
+def best_time(function, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    board = Board.from_string("bench", make_board(50, 50))
+    for count in BATCH_SIZES:
+        programs = make_programs(count)
+        steps = run_scalar(programs, board)
+        scalar = best_time(lambda: run_scalar(programs, board))
+        batch = best_time(lambda: run_batch(programs, board, "bench", "bench", STEP_BUDGET, detect_loops=False))
+        print(f"{count:>5} programs, {steps:>9,} steps: scalar {steps / scalar:>12,.0f} steps/sec, "
+              f"batch {steps / batch:>12,.0f} steps/sec ({scalar / batch:.1f}x)")
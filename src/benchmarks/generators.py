@@ -0,0 +1,49 @@
+import random
+
+COMMANDS = (
+    "UP",
+    "RIGHT",
+    "DOWN",
+    "LEFT",
+    "PICK_UP",
+    "DROP",
+    "NOOP",
+    "GOTO {target}",
+    "GOTO {target} IF SENSOR UP IS WALL",
+)
+
+
+def make_board(width: int, height: int, seed: int = 0) -> str:
+    """A walled rectangle of floor with a few holes, with the start, object, drop zone and finish on the edges."""
+    rng = random.Random(seed)
+    rows = []
+    for y in range(height):
+        if y == 0 or y == height - 1:
+            rows.append(["1"] * width)
+            continue
+        row = ["1"] + ["0" if rng.random() < 0.05 else "2" for _ in range(width - 2)] + ["1"]
+        rows.append(row)
+
+    rows[1][1] = "s"
+    rows[1][width - 2] = "o"
+    rows[height - 2][width - 2] = "d"
+    rows[height - 2][1] = "f"
+    return "\n".join("".join(row) for row in rows)
+
+
+def make_program(length: int, seed: int = 0) -> str:
+    """A program mixing every command, with comments on some of the lines."""
+    rng = random.Random(seed)
+    lines = []
+    for line in range(1, length + 1):
+        command = rng.choice(COMMANDS).format(target=rng.randint(1, length))
+        comment = " // generated" if line % 3 == 0 else ""
+        lines.append(f"{line} {command}{comment}")
+    return "\n".join(lines)
+
+
+def make_loop_program(length: int) -> str:
+    """A program of `length` lines that falls through NOOPs and jumps back to the top until the budget runs out."""
+    lines = [f"{line} NOOP" for line in range(1, length)]
+    lines.append(f"{length} GOTO 1")
+    return "\n".join(lines)
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+# Packages that must never be loaded by importing the engine: the bot's stack and the optional batch engine
+FORBIDDEN = ("discord", "aiohttp", "asyncio", "numpy")
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """(self, cumulative) import time in microseconds of every module loaded by importing `module`, measured in a
+    fresh interpreter"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def check(module: str, budget_ms: float, runs: int = 5) -> list[str]:
+    """Problems with importing `module`, none when it stays within the budget without loading FORBIDDEN packages.
+
+    The budget is for the time spent in the modules of the `module`'s own package: the standard library it needs is
+    loaded by every worker anyway. The best of a few runs is kept, the others are mostly disturbed by the machine.
+    """
+    package = module.split(".")[0]
+    best_own = best_total = float("inf")
+    loaded: set[str] = set()
+    for _ in range(runs):
+        times = import_times(module)
+        own = sum(own for name, (own, _) in times.items() if name.split(".")[0] == package)
+        best_own = min(best_own, own / 1000)
+        best_total = min(best_total, times[module][1] / 1000)
+        loaded.update(name.split(".")[0] for name in times if name.split(".")[0] in FORBIDDEN)
+
+    print(f"{module}: {best_own:.1f} ms in {package} (budget {budget_ms:.1f} ms), {best_total:.1f} ms in total")
+    problems = []
+    if loaded:
+        problems.append(f"importing {module} loads {', '.join(sorted(loaded))}")
+    if best_own > budget_ms:
+        problems.append(f"importing {module} spends {best_own:.1f} ms in {package}, the budget is {budget_ms:.1f} ms")
+    return problems
@@ -0,0 +1,30 @@
+import time
+
+from benchmarks.generators import make_loop_program
+from game.coding.program import Parser, Program
+from game.robot_game import RobotChallenge, RobotEntity, RobotGame
+
+BOARD = "1111\n1s21\n1111"
+PROGRAM_LENGTHS = (10, 50, 200, 1000)
+
+
+def steps_per_second(length: int, repeat: int = 5) -> float:
+    challenge = RobotChallenge("bench", BOARD)
+    source_code = Parser(make_loop_program(length)).parse()
+    best = float("inf")
+    steps = 0
+    for _ in range(repeat):
+        program = Program(source_code, None)
+        game = RobotGame("bench", challenge.board, RobotEntity(challenge.board), challenge.name)
+        start = time.perf_counter()
+        # Loop detection would stop these programs after one lap, this measures raw dispatch
+        program.run(game, "bench", detect_loops=False)
+        elapsed = time.perf_counter() - start
+        steps = program.duration
+        best = min(best, elapsed)
+    return steps / best
+
+
+if __name__ == "__main__":
+    for program_length in PROGRAM_LENGTHS:
+        print(f"{program_length:>5} lines: {steps_per_second(program_length):>12,.0f} steps/sec")
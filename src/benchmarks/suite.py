@@ -0,0 +1,104 @@
+import json
+import platform
+import timeit
+from dataclasses import dataclass
+from typing import Callable
+
+from benchmarks.generators import make_board, make_loop_program, make_program
+from game.board import Board
+from game.coding.program import Parser, Program
+from game.robot_game import RobotEntity, RobotGame
+
+PROGRAM_SIZES = (10, 100, 1000, 10000)
+BOARD_SIZES = (5, 50, 500)
+LOOP_SIZES = (2, 200)
+# Fixed rather than Program.MAX_DURATION, so the numbers stay comparable when the budget changes
+LOOP_STEP_BUDGET = 1000
+
+
+@dataclass
+class Benchmark:
+    name: str
+    make: Callable[[], Callable[[], object]]
+    """Builds the inputs outside of the timing and returns the function to time"""
+
+
+def bench_parse(lines: int) -> Callable[[], object]:
+    source = make_program(lines)
+    return lambda: Parser(source).parse()
+
+
+def bench_board_from_string(size: int) -> Callable[[], object]:
+    challenge_string = make_board(size, size)
+    return lambda: Board.from_string("bench", challenge_string)
+
+
+def bench_get_emojis(size: int) -> Callable[[], object]:
+    board = Board.from_string("bench", make_board(size, size))
+    return board.get_emojis
+
+
+def bench_execute_loop(lines: int) -> Callable[[], object]:
+    board = Board.from_string("bench", make_board(5, 5))
+    program = Program(Parser(make_loop_program(lines)).parse(), None)
+
+    def run():
+        game = RobotGame("bench", board, RobotEntity(board), "bench")
+        program.pc = 0
+        program.duration = 0
+        return program.run(game, "bench", step_budget=LOOP_STEP_BUDGET, detect_loops=False)
+
+    return run
+
+
+BENCHMARKS: list[Benchmark] = [
+    *(Benchmark(f"parse/{lines}_lines", lambda lines=lines: bench_parse(lines)) for lines in PROGRAM_SIZES),
+    *(Benchmark(f"board_from_string/{size}x{size}", lambda size=size: bench_board_from_string(size))
+      for size in BOARD_SIZES),
+    *(Benchmark(f"execute_loop/{lines}_lines", lambda lines=lines: bench_execute_loop(lines)) for lines in LOOP_SIZES),
+    *(Benchmark(f"get_emojis/{size}x{size}", lambda size=size: bench_get_emojis(size)) for size in BOARD_SIZES),
+]
+
+
+def measure(function: Callable[[], object], repeat: int = 5) -> float:
+    """Best time per call in seconds. The best run is the least disturbed by the rest of the machine."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(name_filter: str = "", repeat: int = 5) -> dict:
+    results = {}
+    for benchmark in BENCHMARKS:
+        if name_filter not in benchmark.name:
+            continue
+        results[benchmark.name] = measure(benchmark.make(), repeat)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[tuple[str, float, float, float]]:
+    """Returns (name, baseline, current, change) for every benchmark slower than the baseline by more than threshold."""
+    regressions = []
+    for name, seconds in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = seconds / before - 1
+        if change > threshold:
+            regressions.append((name, before, seconds, change))
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def save(path: str, results: dict):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
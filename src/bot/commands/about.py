@@ -7,7 +7,8 @@ class About(commands.Cog):
     async def about(self, ctx: commands.Context):
         """What is this game about?"""
 
-        await ctx.send(
+        await ctx.bot.outbox.send(
+            ctx.channel,
             f"""
 ## What is this game?
 There is a robot somewhere on the moon performing tasks and they have asked you to program their every action.
@@ -42,7 +43,8 @@ Comments are ignored.
     async def mapping(self, ctx: commands.Context):
         """How do you make maps?"""
 
-        await ctx.send(
+        await ctx.bot.outbox.send(
+            ctx.channel,
             f"""
 ## How do you create maps?
 Maps are created by using the following characters:
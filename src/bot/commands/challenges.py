@@ -1,14 +1,106 @@
+import asyncio
+import tempfile
+
+import aiohttp
 from discord.ext import commands
 
+from game.board import MAX_SIDE, Board
 from game.robot_game import RobotChallenge
-from game.coding.program import Program, Parser
+from game.solver import Solver
+from game.submission_store import Submission
+from game.tracing import SubmissionTimer
+from game.coding.program import Program
+from game.exceptions import BoardException, BoardTooLargeException, NameForChallengeAlreadyExistsException, \
+    SubmissionRejectedException
+from ..outbox import StatusMessage
+from ..pages import MESSAGE_LIMIT, message_length, truncate
 from ..robotbot import RobotBot
 
 
-async def on_finished_execution(program: Program, ctx: commands.Context):
-    print("Finished execution")
+def guild_id(ctx: commands.Context) -> int:
+    # Challenges created in direct messages share the 0 namespace
+    return ctx.guild.id if ctx.guild is not None else 0
+
+
+def shortest_solution(challenge: RobotChallenge) -> str:
+    if challenge.optimal_steps is None:
+        return ""
+    return f"\n🏁 Shortest possible solution: {challenge.optimal_steps} steps"
+
+
+def map_message(intro: str, challenge: RobotChallenge) -> str:
+    board = challenge.board
+    too_big = f"{intro}: {board.width}x{board.height}, too big to show in a message{shortest_solution(challenge)}"
+    # Every tile takes at least one character, large maps are turned down before rendering them
+    if board.width * board.height > MESSAGE_LIMIT:
+        return too_big
+    message = f"{intro}:\n{challenge.initial_map}{shortest_solution(challenge)}"
+    if message_length(message) > MESSAGE_LIMIT:
+        return too_big
+    return message
+
+
+# A full size map with CRLF line ends
+MAX_ATTACHMENT_BYTES = (MAX_SIDE + 2) * MAX_SIDE
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=30)
+# What downloading an attached map can fail with
+DOWNLOAD_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# Solving takes about a second on a full size map, maps bigger than this are solved away from the event loop
+MAX_INLINE_SOLVE_CELLS = 500 * 500
+
+
+async def read_challenge(ctx: commands.Context, name: str, challenge_string_rows: tuple[str, ...]) -> RobotChallenge:
+    """The map attached to the message if there is one, otherwise the rows typed after the name"""
+    if not ctx.message.attachments:
+        return RobotChallenge(name, "\n".join(challenge_string_rows))
+
+    attachment = ctx.message.attachments[0]
+    if attachment.size > MAX_ATTACHMENT_BYTES:
+        raise BoardTooLargeException(name, MAX_SIDE)
+    # Attachment.read() would hold the whole file, it is downloaded to disk a chunk at a time instead
+    with tempfile.TemporaryFile() as file:
+        async with aiohttp.ClientSession(timeout=DOWNLOAD_TIMEOUT) as session, session.get(attachment.url) as response:
+            response.raise_for_status()
+            size = 0
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_ATTACHMENT_BYTES:
+                    raise BoardTooLargeException(name, MAX_SIDE)
+                file.write(chunk)
+        file.seek(0)
+        # Parsed row by row from the file, and every row must be as wide as the first
+        return RobotChallenge(name, board=Board.from_lines(name, file, rectangular=True))
+
+
+def download_failed(name: str, error: Exception) -> str:
+    print(f"Unable to download the map of challenge {name}: {error!r}")
+    return f"Unable to download the map of challenge {name}, please try again"
+
+
+async def minimum_steps(solver: Solver, challenge: RobotChallenge) -> int:
+    board = challenge.board
+    if board.width * board.height > MAX_INLINE_SOLVE_CELLS:
+        return await asyncio.to_thread(solver.minimum_steps, challenge.name, board)
+    return solver.minimum_steps(challenge.name, board)
+
+
+def last_seen(program: Program) -> str:
+    if program.trace is None or len(program.trace) == 0:
+        return ""
+    state = program.trace.state_at(len(program.trace))
+    carrying = ", carrying the object" if state.has_object else ""
+    return (f"📍 Last seen at {state.position} after line {program.compiled.line_numbers[state.pc]}"
+            f"{carrying}\n")
+
+
+async def reply(ctx: commands.Context, content: str):
+    await ctx.bot.outbox.send(ctx.channel, content)
+
+
+async def on_finished_execution(program: Program, ctx: commands.Context, status: StatusMessage | None = None):
     if program.results.success:
-        await ctx.send(
+        content = (
             f"🎉 Congratulations, {ctx.author.name}! 🌟\n"
             f"──────────────────────────\n"
             f"🔥 **Challenge Solved!** 🔥\n"
@@ -17,15 +109,20 @@ async def on_finished_execution(program: Program, ctx: commands.Context):
             f"──────────────────────────"
         )
     else:
-        await ctx.send(
+        content = (
             f"⚠️ Uh-oh, {ctx.author.name}, something didn't go as planned... ⚠️\n"
             f"──────────────────────────\n"
             f"🔍 **Challenge Attempt** 🔍\n"
             f"👣 Steps: {program.results.steps}\n"
             f"⌛ Duration: {program.results.duration}\n"
             f"❌ Error: {program.results.error}\n"
+            f"{last_seen(program)}"
             f"──────────────────────────"
         )
+    if status is None:
+        await reply(ctx, content)
+    else:
+        await status.update(content)
 
 
 class Challenges(commands.Cog):
@@ -38,32 +135,105 @@ class Challenges(commands.Cog):
                             name: str = commands.param(description="str: Name of the challenge"),
                             *challenge_string_rows: str
                             ):
-        """Create a new challenge for others to play."""
+        """Create a new challenge for others to play. The map can also be attached as a text file."""
 
-        challenge_string = "\n".join(challenge_string_rows)
-        await ctx.send(f"Adding challenge {name}")
-        challenge = RobotChallenge(name, challenge_string)
-        if name in [challenge.name for challenge in self.bot.challenges]:
-            await ctx.send(f"Challenge {name} already exists")
+        # Edited into the outcome, a quick one replaces it before it is even posted
+        status = self.bot.outbox.status(ctx.channel, f"Adding challenge {name}")
+        try:
+            challenge = await read_challenge(ctx, name, challenge_string_rows)
+            challenge.optimal_steps = await minimum_steps(self.bot.solver, challenge)
+        except BoardException as e:
+            await status.update(str(e))
+            return
+        except DOWNLOAD_ERRORS as e:
+            await status.update(download_failed(name, e))
+            return
+        try:
+            await self.bot.challenges.add(guild_id(ctx), challenge)
+        except NameForChallengeAlreadyExistsException:
+            await status.update(f"Challenge {name} already exists")
             return
-        self.bot.challenges.append(challenge)
-        await ctx.send(f"Challenge {name}:\n{challenge.initial_map}")
+        self.bot.challenge_pages.invalidate(guild_id(ctx))
+        await status.update(map_message(f"Challenge {name}", challenge))
+
+    @commands.command(name="update-challenge")
+    async def update_challenge(self,
+                               ctx: commands.Context,
+                               name: str = commands.param(description="str: Name of the challenge"),
+                               *challenge_string_rows: str
+                               ):
+        """Replace the map of an existing challenge. The map can also be attached as a text file."""
+
+        try:
+            challenge = await read_challenge(ctx, name, challenge_string_rows)
+            challenge.optimal_steps = await minimum_steps(self.bot.solver, challenge)
+        except BoardException as e:
+            await reply(ctx, str(e))
+            return
+        except DOWNLOAD_ERRORS as e:
+            await reply(ctx, download_failed(name, e))
+            return
+        previous = await self.bot.challenges.replace(guild_id(ctx), challenge)
+        if previous is None:
+            await reply(ctx, f"Challenge {name} does not exist")
+            return
+        # Stored results were graded against the old map
+        self.bot.executor.result_cache.invalidate(previous.board.content_hash)
+        self.bot.challenge_pages.invalidate(guild_id(ctx))
+        await reply(ctx, map_message(f"Challenge {name} updated", challenge))
+
+    @commands.command(name="remove-challenge")
+    async def remove_challenge(self,
+                               ctx: commands.Context,
+                               name: str = commands.param(description="str: Name of the challenge")):
+        """Remove a challenge."""
+
+        challenge = await self.bot.challenges.get(guild_id(ctx), name)
+        if challenge is None or not await self.bot.challenges.remove(guild_id(ctx), name):
+            await reply(ctx, f"Challenge {name} does not exist")
+            return
+        self.bot.executor.result_cache.invalidate(challenge.board.content_hash)
+        self.bot.challenge_pages.invalidate(guild_id(ctx))
+        await reply(ctx, f"Challenge {name} removed")
 
     @commands.command(name="list-challenges")
-    async def get_available_challenges(self, ctx: commands.Context):
+    async def get_available_challenges(self,
+                                       ctx: commands.Context,
+                                       page: int = commands.param(default=1, description="int: Page to show")):
         """What challenges are available?"""
 
-        all_challenges: list[RobotChallenge] = self.bot.challenges
-        challenges_message = "\n".join(
-            [f"{idx}. {challenge.name}:\n{challenge.initial_map}" for idx, challenge in enumerate(all_challenges)])
-        await ctx.send(f"Available challenges:\n{challenges_message}")
+        content, page_count = await self.bot.challenge_pages.page(guild_id(ctx), page)
+        if page_count == 0:
+            await reply(ctx, "There are no challenges yet")
+            return
+        if content is None:
+            await reply(ctx, f"There are only {page_count} pages of challenges")
+            return
+
+        footer = f"\nPage {page}/{page_count}"
+        if page < page_count:
+            footer += f", next page: `{ctx.prefix}list-challenges {page + 1}`"
+        await reply(ctx, f"Available challenges:\n{content}{footer}")
 
+    @commands.command(name="show-challenge")
+    async def show_challenge(self,
+                             ctx: commands.Context,
+                             name: str = commands.param(description="str: Name of the challenge")):
+        """Show the map of a challenge."""
+
+        challenge = await self.bot.challenges.get(guild_id(ctx), name)
+        if challenge is None:
+            await reply(ctx, f"Challenge {name} does not exist")
+            return
+        await reply(ctx, map_message(f"Challenge {name}", challenge))
+
+    @update_challenge.error
     @add_challenge.error
     async def add_challenge_error(self, ctx: commands.Context, error: commands.CommandError):
         if isinstance(error, commands.MissingRequiredArgument):
-            await ctx.send(error.param.name + " is a required argument that is missing")
+            await reply(ctx, error.param.name + " is a required argument that is missing")
         else:
-            await ctx.send("Unknown error")
+            await reply(ctx, "Unknown error")
 
     @commands.command(name="solve")
     async def solve_challenge(self, ctx: commands.Context, *, args):
@@ -71,24 +241,105 @@ class Challenges(commands.Cog):
 
         challenge_name = args.split("\n")[0].strip()
         code = "\n".join(args.split("\n")[1:]).strip()
-        challenge = next((challenge for challenge in self.bot.challenges if challenge.name == challenge_name), None)
+        challenge = await self.bot.challenges.get(guild_id(ctx), challenge_name)
         if challenge is None:
-            await ctx.send(f"Challenge {challenge_name} does not exist")
+            await reply(ctx, f"Challenge {challenge_name} does not exist")
             return
-        game = await challenge.add_player(ctx.author)
-        await ctx.send(f"Trying {ctx.author.name}'s solution for {challenge_name}...")
-        parser = Parser(code)
+        timer = self.bot.tracer.submission(challenge=challenge_name, player=ctx.author.id)
+        with timer.phase("build_board"):
+            game = await self.bot.sessions.open(guild_id(ctx), challenge, ctx.author.id)
+        status = self.bot.outbox.status(ctx.channel, f"Trying {ctx.author.name}'s solution for {challenge_name}...")
         try:
-            parser.parse()
+            with timer.phase("parse"):
+                program = Program(self.bot.compile_cache.compile(code), ctx)
         except Exception as e:
-            await ctx.send(f"❌ Something went wrong while parsing your code, {ctx.author.name}! ❌\n"
-                           f"──────────────────────────"
-                           f"```Error parsing code: {e}```")
+            self.bot.sessions.finish(guild_id(ctx), challenge_name, ctx.author.id)
+            self.bot.metrics.record_compile_error(e)
+            self.finish_submission(timer, "compile_error")
+            header = (f"❌ Something went wrong while parsing your code, {ctx.author.name}! ❌\n"
+                      f"──────────────────────────")
+            error = truncate(f"Error parsing code: {e}", MESSAGE_LIMIT - message_length(header) - len("``````"))
+            await status.update(f"{header}```{error}```")
             return
-        program = Program(parser.parse(), ctx)
-        print(f"Program: {program}")
         program.finished_execution_event.subscribe(on_finished_execution)
-        await program.execute(game, ctx)
+        async def execute():
+            # Timed once a worker runs it, the wait in the queue is measured by the scheduler
+            with timer.phase("execute"):
+                return await self.bot.executor.execute(program, game, ctx.author.display_name, record_trace=True)
+
+        try:
+            await self.bot.scheduler.submit(guild_id(ctx), ctx.author.id, execute)
+        except SubmissionRejectedException as e:
+            await status.update(f"⏳ {e}, {ctx.author.name}.")
+            self.bot.sessions.finish(guild_id(ctx), challenge_name, ctx.author.id)
+            self.finish_submission(timer, "busy")
+            return
+        except Exception as e:
+            print(f"Running {ctx.author.name}'s solution for {challenge_name} failed: {e!r}")
+            await status.update(f"💥 The robot broke down before finishing your solution, {ctx.author.name}. "
+                                f"Please try again.")
+            self.bot.sessions.finish(guild_id(ctx), challenge_name, ctx.author.id)
+            self.finish_submission(timer, "error")
+            return
+        results = program.results
+        self.bot.submissions.record(Submission(
+            guild_id=guild_id(ctx),
+            challenge_name=challenge_name,
+            challenge_hash=challenge.board.content_hash,
+            user_id=ctx.author.id,
+            player_name=ctx.author.name,
+            source=code,
+            success=results.success,
+            termination=results.termination,
+            steps=results.steps,
+            duration=results.duration,
+            program_length=len(program.compiled),
+            error=results.error,
+        ))
+        with timer.phase("reply"):
+            await program.finished_execution_event.trigger(program, ctx, status)
+        self.bot.sessions.finish(guild_id(ctx), challenge_name, ctx.author.id)
+        self.finish_submission(timer, "success" if program.results.success else "failure")
+
+    def finish_submission(self, timer: SubmissionTimer, outcome: str):
+        timer.finish(outcome=outcome)
+        self.bot.metrics.record_submission(outcome, timer.phases)
+
+    @commands.command(name="leaderboard")
+    async def leaderboard(self,
+                          ctx: commands.Context,
+                          name: str = commands.param(description="str: Name of the challenge")):
+        """Who solved a challenge best?"""
+
+        challenge = await self.bot.challenges.get(guild_id(ctx), name)
+        if challenge is None:
+            await reply(ctx, f"Challenge {name} does not exist")
+            return
+        entries = await self.bot.submissions.leaderboard(guild_id(ctx), name, challenge.board.content_hash)
+        if not entries:
+            await reply(ctx, f"Nobody has solved {name} yet")
+            return
+        medals = ["🥇", "🥈", "🥉"]
+        lines = [
+            f"{medals[rank] if rank < len(medals) else f'{rank + 1}.'} {entry.player_name}: "
+            f"{entry.duration} steps, {entry.program_length} instructions"
+            for rank, entry in enumerate(entries)
+        ]
+        await reply(ctx, f"🏆 **Leaderboard for {name}**{shortest_solution(challenge)}\n" + "\n".join(lines))
+
+    @commands.command(name="queue")
+    async def queue_status(self, ctx: commands.Context):
+        """How busy is the robot?"""
+
+        stats = self.bot.scheduler.stats()
+        sessions = self.bot.sessions.stats()
+        await reply(
+            ctx,
+            f"🤖 Solutions waiting: {stats['queued']}, running: {stats['in_flight']}\n"
+            f"⏱️ Wait time: {stats['wait_p50']:.2f}s typical, {stats['wait_p99']:.2f}s worst (p99)\n"
+            f"🎮 Games in memory: {sessions['sessions']} ({sessions['finished']} finished), "
+            f"{sessions['bytes'] / 1024:.1f} KiB, largest {sessions['largest_bytes']} bytes"
+        )
 
 
 async def setup(bot: RobotBot):
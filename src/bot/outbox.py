@@ -0,0 +1,196 @@
+import asyncio
+from collections import deque
+
+import discord
+
+from bot.pages import MESSAGE_LIMIT, paginate
+
+# Rate limits that need a longer wait than this raise discord.RateLimited instead of sleeping inside discord.py's HTTP
+# client, which lets the outbox hold them. 30 seconds is the least discord.py accepts
+MAX_RATELIMIT_TIMEOUT = 30.0
+
+
+class StatusMessage:
+    """One message that is posted once and then edited in place, e.g. "Trying..." and then the results.
+
+    Updates that arrive before the previous one went out replace it, only the latest content is ever sent. A status
+    that is done within the outbox window is posted once, with its final content.
+    """
+    outbox: 'Outbox'
+    channel: discord.abc.Messageable
+    content: str
+    message: discord.Message | None
+    queued: bool
+    waiting: list[asyncio.Future]
+
+    def __init__(self, outbox: 'Outbox', channel: discord.abc.Messageable, content: str):
+        self.outbox = outbox
+        self.channel = channel
+        self.content = content
+        self.message = None
+        self.queued = False
+        self.waiting = []
+
+    async def update(self, content: str):
+        """Shows `content` instead, returns once it is on Discord"""
+        self.content = content
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.outbox.enqueue(self.channel, self)
+        await future
+
+    async def _publish(self):
+        if self.message is None:
+            self.message = await self.channel.send(self.content)
+        else:
+            await self.message.edit(content=self.content)
+
+
+class Outgoing:
+    content: str
+    future: asyncio.Future
+
+    def __init__(self, content: str):
+        self.content = content
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ChannelOutbox:
+    """What is waiting to be sent to one channel, delivered in order by a task that only runs while there is some"""
+    outbox: 'Outbox'
+    channel: discord.abc.Messageable
+    items: deque[Outgoing | StatusMessage]
+    paused_until: float
+
+    def __init__(self, outbox: 'Outbox', channel: discord.abc.Messageable):
+        self.outbox = outbox
+        self.channel = channel
+        self.items = deque()
+        self.paused_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    def enqueue(self, item: Outgoing | StatusMessage):
+        if isinstance(item, StatusMessage):
+            if item.queued:
+                # Still waiting, it will go out with its latest content
+                return
+            item.queued = True
+        self.items.append(item)
+        if self._task is None:
+            self._task = asyncio.create_task(self._deliver())
+
+    async def _deliver(self):
+        try:
+            # Whatever else is said in the channel meanwhile goes out with it
+            await asyncio.sleep(self.outbox.window)
+            while self.items:
+                item = self.items.popleft()
+                if isinstance(item, StatusMessage):
+                    await self._deliver_status(item)
+                else:
+                    batch = [item]
+                    while self.items and isinstance(self.items[0], Outgoing):
+                        batch.append(self.items.popleft())
+                    await self._deliver_batch(batch)
+        finally:
+            self._task = None
+            if not self.items and self.outbox.channels.get(self.channel.id) is self:
+                del self.outbox.channels[self.channel.id]
+
+    async def _deliver_status(self, status: StatusMessage):
+        status.queued = False
+        waiting, status.waiting = status.waiting, []
+        try:
+            await self._with_backoff(status._publish)
+        except Exception as e:
+            if not waiting:
+                # Nobody is waiting for the first post of a status
+                print(f"Unable to post to channel {self.channel.id}: {e!r}")
+            _fail(waiting, e)
+        else:
+            _succeed(waiting)
+
+    async def _deliver_batch(self, batch: list[Outgoing]):
+        waiting = [outgoing.future for outgoing in batch]
+        try:
+            for page in paginate((outgoing.content for outgoing in batch), MESSAGE_LIMIT):
+                await self._with_backoff(lambda: self.channel.send(page))
+        except Exception as e:
+            _fail(waiting, e)
+        else:
+            _succeed(waiting)
+
+    async def _with_backoff(self, send):
+        # Short waits are slept through by discord.py itself. A 429 it gave up on is an HTTPException and isn't
+        # retried here again, it would only dig the hole deeper
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.outbox.max_attempts):
+            delay = self.paused_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await send()
+            except discord.RateLimited as e:
+                if attempt == self.outbox.max_attempts - 1:
+                    raise
+                self.outbox.rate_limited += 1
+                print(f"Rate limited on channel {self.channel.id}, retrying in {e.retry_after:.2f}s")
+                self.paused_until = loop.time() + e.retry_after
+
+
+def _succeed(futures: list[asyncio.Future]):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
+def _fail(futures: list[asyncio.Future], error: Exception):
+    for future in futures:
+        if not future.done():
+            future.set_exception(error)
+
+
+class Outbox:
+    """Every message the bot sends goes through here, to spend as few requests of Discord's rate limits as it can.
+
+    Replies to a channel within `window` seconds of each other are sent together, in as few messages as they fit in.
+    Progress is shown by editing one StatusMessage rather than posting more. A rate limit longer than
+    MAX_RATELIMIT_TIMEOUT pauses the channel for as long as Discord asks, and what piles up meanwhile goes out together
+    afterwards. The bot must be created with max_ratelimit_timeout=MAX_RATELIMIT_TIMEOUT for those to reach the outbox.
+    """
+    window: float
+    max_attempts: int
+    channels: dict[int, ChannelOutbox]
+    rate_limited: int
+    """Requests held back by a rate limit and retried"""
+
+    def __init__(self, window: float = 0.25, max_attempts: int = 5):
+        self.window = window
+        self.max_attempts = max_attempts
+        self.channels = {}
+        self.rate_limited = 0
+
+    def enqueue(self, channel: discord.abc.Messageable, item: Outgoing | StatusMessage):
+        outbox = self.channels.get(channel.id)
+        if outbox is None:
+            outbox = self.channels[channel.id] = ChannelOutbox(self, channel)
+        outbox.enqueue(item)
+
+    async def send(self, channel: discord.abc.Messageable, content: str):
+        """Sends `content` to the channel, possibly together with other replies. Returns once it is on Discord"""
+        outgoing = Outgoing(content)
+        self.enqueue(channel, outgoing)
+        await outgoing.future
+
+    def status(self, channel: discord.abc.Messageable, content: str) -> StatusMessage:
+        """A message that updates will edit. It is posted in the background, not waiting for it lets the first
+        updates replace its content before it is even sent"""
+        status = StatusMessage(self, channel, content)
+        self.enqueue(channel, status)
+        return status
+
+    def close(self):
+        for outbox in list(self.channels.values()):
+            if outbox._task is not None:
+                outbox._task.cancel()
+        self.channels.clear()
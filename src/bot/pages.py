@@ -0,0 +1,100 @@
+import asyncio
+from typing import Iterable, Iterator
+
+from game.board import Board
+from game.challenge_store import ChallengeStore
+from game.exceptions import GameException
+
+MESSAGE_LIMIT = 2000
+# Room left in every page for the header and the navigation footer
+PAGE_LIMIT = MESSAGE_LIMIT - 200
+
+
+def message_length(text: str) -> int:
+    # Discord counts UTF-16 code units, most emojis take two
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text: str, limit: int) -> str:
+    """`text` cut to at most `limit` UTF-16 code units, ending with an ellipsis when it was cut"""
+    if message_length(text) <= limit:
+        return text
+    # Cut by code units from an upper bound on the characters, emojis count twice
+    text = text[:limit - 1]
+    while message_length(text) > limit - 1:
+        text = text[:-1]
+    return text + "…"
+
+
+def paginate(entries: Iterable[str], limit: int = PAGE_LIMIT) -> Iterator[str]:
+    """Packs entries into as few pages as possible without splitting any of them"""
+    page: list[str] = []
+    length = 0
+    for entry in entries:
+        entry_length = message_length(entry) + 1
+        if page and length + entry_length > limit:
+            yield "\n".join(page)
+            page, length = [], 0
+        page.append(entry)
+        length += entry_length
+    if page:
+        yield "\n".join(page)
+
+
+def render_entry(index: int, name: str, challenge_string: str, command_prefix: str) -> str:
+    too_big = f"{index}. {name}: too big to show here, use `{command_prefix}show-challenge {name}`"
+    # Every tile is at least one character, large maps are turned down without being parsed
+    if len(challenge_string) - challenge_string.count("\n") > PAGE_LIMIT:
+        return too_big
+    try:
+        emojis = Board.from_string(name, challenge_string).get_emojis()
+    except GameException:
+        emojis = "⚠️ This map can't be read anymore"
+    entry = f"{index}. {name}:\n{emojis}"
+    if message_length(entry) > PAGE_LIMIT:
+        return too_big
+    return entry
+
+
+class ChallengePages:
+    """Rendered `list-challenges` pages per guild.
+
+    Pages are rendered once and kept until a challenge of the guild is added, updated or removed, so showing a page
+    does not depend on how many challenges there are.
+    """
+    store: ChallengeStore
+    command_prefix: str
+    pages: dict[int, list[str]]
+    generation: int
+    """Bumped by every invalidation, pages rendered before it may be stale and aren't kept"""
+
+    def __init__(self, store: ChallengeStore, command_prefix: str):
+        self.store = store
+        self.command_prefix = command_prefix
+        self.pages = {}
+        self.generation = 0
+
+    async def page(self, guild_id: int, number: int) -> tuple[str | None, int]:
+        """The page (counted from 1) and the number of pages. The page is None when it does not exist"""
+        pages = self.pages.get(guild_id)
+        if pages is None:
+            generation = self.generation
+            # Rendered in a thread, the store's database is only used from threads
+            pages = await asyncio.to_thread(self._render, guild_id)
+            if generation == self.generation:
+                self.pages[guild_id] = pages
+
+        if not 1 <= number <= len(pages):
+            return None, len(pages)
+        return pages[number - 1], len(pages)
+
+    def _render(self, guild_id: int) -> list[str]:
+        entries = (
+            render_entry(index, name, challenge_string, self.command_prefix)
+            for index, (name, challenge_string) in enumerate(self.store.all(guild_id))
+        )
+        return list(paginate(entries))
+
+    def invalidate(self, guild_id: int):
+        self.generation += 1
+        self.pages.pop(guild_id, None)
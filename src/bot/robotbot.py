@@ -1,17 +1,114 @@
+import asyncio
+import os
+
 import discord
 from cogwatch import watch
 from discord.ext import commands
 
-from game.robot_game import RobotChallenge
+from bot.outbox import MAX_RATELIMIT_TIMEOUT, Outbox
+from bot.pages import ChallengePages
+from game.challenge_store import ChallengeStore
+from game.coding.executor import ProgramExecutor
+from game.coding.program import CompileCache, Program
+from game.metrics import RobotMetrics, serve
+from game.scheduler import SubmissionScheduler
+from game.sessions import SessionManager
+from game.solver import Solver
+from game.submission_store import SubmissionStore
+from game.tracing import Tracer
 
 
 class RobotBot(commands.Bot):
-    challenges: list[RobotChallenge] = []
+    challenges: ChallengeStore
+    challenge_pages: ChallengePages
+    compile_cache: CompileCache
+    executor: ProgramExecutor
+    metrics: RobotMetrics
+    outbox: Outbox
+    scheduler: SubmissionScheduler
+    sessions: SessionManager
+    solver: Solver
+    submissions: SubmissionStore
+    tracer: Tracer
 
-    def __init__(self):
+    def __init__(self,
+                 database: str = "robot.db",
+                 workers: int | None = None,
+                 max_pending_solutions: int = 64,
+                 tracer: Tracer | None = None,
+                 change_poll_interval: float = 1.0,
+                 metrics_port: int | None = None,
+                 **options):
         intents = discord.Intents.default()
         intents.message_content = True
-        super().__init__(command_prefix=">", intents=intents)
+        # Long rate limits are left to the outbox instead of being slept through in discord.py's HTTP client
+        options.setdefault("max_ratelimit_timeout", MAX_RATELIMIT_TIMEOUT)
+        super().__init__(command_prefix=">", intents=intents, **options)
+        self.challenges = ChallengeStore(database)
+        self.submissions = SubmissionStore(database)
+        self.challenge_pages = ChallengePages(self.challenges, self.command_prefix)
+        self.compile_cache = CompileCache()
+        self.sessions = SessionManager()
+        self.solver = Solver()
+        self.tracer = tracer or Tracer()
+        workers = workers or os.cpu_count() or 1
+        self.outbox = Outbox()
+        self.metrics = RobotMetrics()
+        self.executor = ProgramExecutor(max_workers=workers, max_pending=max_pending_solutions, tracer=self.tracer,
+                                        metrics=self.metrics)
+        # Never runs more jobs than there are workers, so solutions wait in the fair queue and not in the pool
+        self.scheduler = SubmissionScheduler(concurrency=workers, max_queued=max_pending_solutions,
+                                             on_wait=self.metrics.queue_wait_seconds.observe)
+        registry = self.metrics.registry
+        registry.gauge("robot_queued_solutions", "Solutions waiting for a worker", lambda: self.scheduler.queued)
+        registry.gauge("robot_running_solutions", "Solutions being run", lambda: self.scheduler.in_flight)
+        registry.gauge("robot_active_sessions", "Games kept in memory", lambda: len(self.sessions.sessions))
+        registry.gauge("robot_rate_limited_requests", "Messages held back by a rate limit since the bot started",
+                       lambda: self.outbox.rate_limited)
+        result_cache = self.executor.result_cache
+        registry.gauge("robot_result_cache_hits", "Solutions answered from the result cache since the bot started",
+                       lambda: result_cache.hits)
+        registry.gauge("robot_result_cache_misses", "Solutions that had to be run since the bot started",
+                       lambda: result_cache.misses)
+        # Shared by the finished execution events of every program
+        dispatch = Program.dispatch_stats
+        registry.gauge("robot_event_dispatches", "Finished execution events triggered since the bot started",
+                       lambda: dispatch.dispatches)
+        registry.gauge("robot_event_errors", "Event subscribers that failed since the bot started",
+                       lambda: dispatch.errors)
+        registry.gauge("robot_event_timeouts", "Event subscribers that timed out since the bot started",
+                       lambda: dispatch.timeouts)
+        registry.gauge("robot_event_latency_p50_seconds", "Typical time to run every subscriber of an event",
+                       lambda: dispatch.snapshot()["latency_p50"])
+        registry.gauge("robot_event_latency_max_seconds", "Slowest of the latest events to run every subscriber",
+                       lambda: dispatch.snapshot()["latency_max"])
+        self.metrics_port = metrics_port
+        self._metrics_server = None
+        self.change_poll_interval = change_poll_interval
+        self._change_watcher: asyncio.Task | None = None
+
+    async def setup_hook(self):
+        self._change_watcher = asyncio.create_task(self._watch_challenges())
+        if self.metrics_port is not None:
+            # Local only, put a proxy in front to scrape it from elsewhere
+            self._metrics_server = await serve(self.metrics.registry, "127.0.0.1", self.metrics_port)
+            print(f"Metrics served at http://127.0.0.1:{self.metrics_port}/metrics")
+
+    async def _watch_challenges(self):
+        # Other bot processes and regrades may share the database, what they change must not be served from the
+        # caches here
+        while True:
+            await asyncio.sleep(self.change_poll_interval)
+            try:
+                changes = await self.challenges.changes()
+            except Exception as e:
+                print(f"Unable to read the challenge changes: {e!r}")
+                continue
+            for guild, name, previous in changes:
+                self.challenge_pages.invalidate(guild)
+                self.submissions.drop_leaderboards(guild, name)
+                if previous is not None:
+                    self.executor.result_cache.invalidate(previous.board.content_hash)
 
     @watch(path='bot/commands', preload=True)
     async def on_ready(self):
@@ -22,3 +119,27 @@ class RobotBot(commands.Bot):
             return
 
         await self.process_commands(message)
+
+    async def close(self):
+        if self._change_watcher is not None:
+            self._change_watcher.cancel()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+        self.outbox.close()
+        await self.scheduler.close()
+        self.executor.shutdown()
+        await super().close()
+        await self.submissions.close()
+        self.challenges.close()
+
+
+class ShardedRobotBot(RobotBot, commands.AutoShardedBot):
+    """RobotBot for deployments that split the gateway shards between several processes.
+
+    Every process runs `shard_ids` out of `shard_count` shards, or all of them when shard_ids is None. A guild always
+    belongs to the same shard, so its sessions and leaderboards stay in one process. Challenges and submissions are
+    shared through the database: all processes must use the same one.
+    """
+
+    def __init__(self, shard_ids: list[int] | None = None, shard_count: int | None = None, **options):
+        super().__init__(shard_ids=shard_ids, shard_count=shard_count, **options)
@@ -1,63 +1,279 @@
+import hashlib
+import re
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
+from functools import cached_property
+from itertools import accumulate
 
-from game.exceptions import MissingStartPositionException, UnknownTileValueException
-from game.tile import Tile, TILES
-from typing import Tuple
+from game.exceptions import (
+    BoardTooLargeException, MissingStartPositionException, RaggedBoardException, UnknownTileValueException,
+)
+from game.tile import Tile, TILES, TILE_TYPES, VOID, START, FINISH, OBJECT, DROP_ZONE
+from typing import Iterable, Tuple
 
+# bytes.translate tables: map characters to tile codes (anything unknown becomes UNKNOWN_TILE) and codes to emojis
+UNKNOWN_TILE = 0xFF
+_CHAR_TO_CODE = bytes(TILES[chr(char)].code if chr(char) in TILES else UNKNOWN_TILE for char in range(256))
+_CODE_TO_CHAR = bytes.maketrans(bytes(tile_type.code for tile_type in TILES.values()), "".join(TILES).encode("ascii"))
+_CODE_TO_EMOJI = {tile_type.code: tile_type.emoji for tile_type in TILE_TYPES}
+MAX_SIDE = 1000
+# Stretches of tiles that aren't void. Gaps of a few void tiles are kept inside a run, they cost less than a new run
+_RUN = re.compile(rb"[^\x00]+(?:\x00{1,16}[^\x00]+)*")
+# Boards at least this void may be stored sparse, unless they are small enough for it not to matter
+SPARSE_VOID_RATIO = 0.5
+SPARSE_MIN_CELLS = 64 * 64
+# What SparseRows takes besides the tiles, measured with tracemalloc: a bytes object and two arrays per row with tiles,
+# only three list slots per row without, two array items per run. Boards are only stored sparse when that takes at
+# most half the memory of every cell
+SPARSE_ROW_BYTES = 250
+SPARSE_EMPTY_ROW_BYTES = 24
+SPARSE_RUN_BYTES = 4
+SPARSE_MAX_SIZE_RATIO = 0.5
+# Shared by the rows without any tiles, never modified
+_NO_RUNS = array("H")
 
-@dataclass
+
+class SparseRows:
+    """The tiles of a mostly void board. Every row keeps its runs of non-void tiles joined in one bytes object, with
+    where each run starts on the row and where it ends in the joined tiles"""
+    __slots__ = ("width", "tiles", "starts", "ends")
+    width: int
+    tiles: list[bytes]
+    starts: list[array]
+    ends: list[array]
+
+    def __init__(self, width: int, tiles: list[bytes], starts: list[array], ends: list[array]):
+        self.width = width
+        self.tiles = tiles
+        self.starts = starts
+        self.ends = ends
+
+    def code(self, x: int, y: int) -> int:
+        starts = self.starts[y]
+        index = bisect_right(starts, x) - 1
+        if index < 0:
+            return VOID
+        ends = self.ends[y]
+        position = (ends[index - 1] if index else 0) + x - starts[index]
+        return self.tiles[y][position] if position < ends[index] else VOID
+
+    def row(self, y: int) -> bytes:
+        return _join_runs(self.tiles[y], self.starts[y], self.ends[y], self.width)
+
+
+def _join_runs(tiles: bytes, starts: array, ends: array, width: int) -> bytes:
+    if len(starts) == 1 and starts[0] == 0:
+        return tiles.ljust(width, b"\0")
+    row = bytearray(width)
+    begin = 0
+    for start, end in zip(starts, ends):
+        row[start:start + end - begin] = tiles[begin:end]
+        begin = end
+    return bytes(row)
+
+
+def _find(cells: bytes, width: int, code: int) -> Tuple[int, int] | None:
+    # Searching from the end keeps the old behaviour of the last tile of a kind winning
+    index = cells.rfind(code)
+    if index < 0:
+        return None
+    return index % width, index // width
+
+
+def _may_be_sparse(width: int, height: int, stored: int) -> bool:
+    """Whether a map is big and void enough that its runs of tiles may be worth keeping instead of every cell"""
+    return width * height >= SPARSE_MIN_CELLS and stored <= width * height * (1 - SPARSE_VOID_RATIO)
+
+
+def _is_sparse(width: int, height: int, stored: int, runs: int, tile_rows: int) -> bool:
+    """Whether SparseRows would take much less memory than every cell, counting what each row and run costs"""
+    size = (tile_rows * SPARSE_ROW_BYTES + (height - tile_rows) * SPARSE_EMPTY_ROW_BYTES + stored
+            + runs * SPARSE_RUN_BYTES)
+    return _may_be_sparse(width, height, stored) and size <= width * height * SPARSE_MAX_SIZE_RATIO
+
+
+@dataclass(frozen=True)
 class Board:
+    """A parsed map. Boards are immutable, so one board is shared by every game of a challenge"""
     start_position: Tuple[int, int] = None
     finish_position: Tuple[int, int] = None
     object_initial_position: Tuple[int, int] = None
     object_drop_zone_position: Tuple[int, int] = None
-    tiles: list[list[Tile]] = None
+    width: int = 0
+    height: int = 0
+    cells: bytes = b""
+    """One tile code per cell, row by row. Cell (x, y) is at y * width + x"""
+    sparse: SparseRows | None = None
+    """Tiles of mostly void boards, `cells` is empty then"""
 
     @staticmethod
     def from_string(challenge_name: str, challenge_string: str) -> 'Board':
         # Split the string into lines to represent rows
         rows = challenge_string.strip().split('\n')
+        width = max(len(row) for row in rows)
+        if width > MAX_SIDE or len(rows) > MAX_SIDE:
+            raise BoardTooLargeException(challenge_name, MAX_SIDE)
+
+        cells = bytearray()
+        for row in rows:
+            try:
+                codes = row.encode("ascii").translate(_CHAR_TO_CODE)
+            except UnicodeEncodeError as e:
+                # e.g. the rendered emoji map pasted back, name the first character that isn't a tile
+                raise UnknownTileValueException(challenge_name, row[e.start])
+            if UNKNOWN_TILE in codes:
+                raise UnknownTileValueException(challenge_name, row[codes.index(UNKNOWN_TILE)])
+
+            # Short rows are padded with the void of space
+            cells += codes
+            cells += bytes(width - len(codes))
 
-        # Create a new Board instance
-        board = Board()
-
-        # Iterate over each row
-        board.tiles = []
-        for y, row in enumerate(rows):
-            board_row = []
-
-            # Iterate over each character in the row to represent tiles
-            for x, char in enumerate(row):
-                if char in TILES:
-                    # Create a Tile instance using the character as a key in the TILES dictionary
-                    tile_type = TILES[char]
-                    tile = Tile(position_x=x, position_y=y, tile_type=tile_type)
-                    board_row.append(tile)
-                    if tile_type.string_value == "START":
-                        board.start_position = (x, y)
-                    elif tile_type.string_value == "FINISH":
-                        board.finish_position = (x, y)
-                    elif tile_type.string_value == "OBJECT":
-                        board.object_initial_position = (x, y)
-                    elif tile_type.string_value == "DROP_ZONE":
-                        board.object_drop_zone_position = (x, y)
-                else:
-                    raise UnknownTileValueException(challenge_name, char)
-
-            # Append the row of tiles to the board's tiles
-            board.tiles.append(board_row)
-
-        if board.start_position is None:
+        if _may_be_sparse(width, len(rows), len(cells) - cells.count(VOID)):
+            # The whole string is in memory already, but the board may outlive it. from_lines counts the runs and
+            # stores the board densely after all if they cost too much
+            return Board.from_lines(challenge_name, rows)
+
+        start_position = _find(cells, width, START)
+        if start_position is None:
+            raise MissingStartPositionException(challenge_name)
+
+        return Board(
+            start_position=start_position,
+            finish_position=_find(cells, width, FINISH),
+            object_initial_position=_find(cells, width, OBJECT),
+            object_drop_zone_position=_find(cells, width, DROP_ZONE),
+            width=width,
+            height=len(rows),
+            cells=bytes(cells),
+        )
+
+    @staticmethod
+    def from_lines(challenge_name: str, lines: Iterable[str | bytes], rectangular: bool = False) -> 'Board':
+        """Parses a map one row at a time, e.g. straight from a file. Only the runs of non-void tiles of the rows read
+        so far are kept, a mostly void map never exists densely in memory.
+
+        Short rows are padded with void, unless `rectangular` is set: then every row must be as wide as the first, and
+        blank lines are only allowed before and after the map.
+        """
+        tiles: list[bytes] = []
+        starts: list[array] = []
+        ends: list[array] = []
+        positions: dict[int, Tuple[int, int]] = {}
+        width = 0
+        stored = 0
+        runs = 0
+        tile_rows = 0
+        blank_rows = 0
+        for line in lines:
+            row = line.rstrip("\r\n") if isinstance(line, str) else line.rstrip(b"\r\n")
+            if not row:
+                # Blank rows only count between two rows of tiles, like the ones strip() leaves in from_string
+                blank_rows += 1
+                continue
+            if starts and blank_rows and rectangular:
+                raise RaggedBoardException(challenge_name, len(starts) + 1, 0, width)
+            if starts:
+                tiles.extend(b"" for _ in range(blank_rows))
+                starts.extend(_NO_RUNS for _ in range(blank_rows))
+                ends.extend(_NO_RUNS for _ in range(blank_rows))
+            blank_rows = 0
+
+            if isinstance(row, str):
+                try:
+                    row = row.encode("ascii")
+                except UnicodeEncodeError as e:
+                    raise UnknownTileValueException(challenge_name, row[e.start])
+            codes = row.translate(_CHAR_TO_CODE)
+            if UNKNOWN_TILE in codes:
+                # Uploads are bytes, name the whole character rather than the first byte of its UTF-8 sequence
+                index = codes.index(UNKNOWN_TILE)
+                raise UnknownTileValueException(challenge_name, row[index:index + 4].decode("utf-8", "replace")[0])
+
+            y = len(starts)
+            if rectangular and y > 0 and len(codes) != width:
+                raise RaggedBoardException(challenge_name, y + 1, len(codes), width)
+            width = max(width, len(codes))
+            if width > MAX_SIDE or y >= MAX_SIDE:
+                raise BoardTooLargeException(challenge_name, MAX_SIDE)
+
+            for code in (START, FINISH, OBJECT, DROP_ZONE):
+                # Searching from the end keeps the old behaviour of the last tile of a kind winning
+                x = codes.rfind(code)
+                if x >= 0:
+                    positions[code] = (x, y)
+
+            if codes.count(VOID) * 2 <= len(codes):
+                # Mostly tiles, the row is kept whole
+                row_tiles, row_starts, row_ends = codes, array("H", (0,)), array("H", (len(codes),))
+            else:
+                matches = list(_RUN.finditer(codes))
+                row_tiles = b"".join(match.group() for match in matches)
+                row_starts = array("H", (match.start() for match in matches)) if matches else _NO_RUNS
+                row_ends = array("H", accumulate(match.end() - match.start() for match in matches)) \
+                    if matches else _NO_RUNS
+            tiles.append(row_tiles)
+            starts.append(row_starts)
+            ends.append(row_ends)
+            stored += len(row_tiles)
+            runs += len(row_starts)
+            tile_rows += row_starts is not _NO_RUNS
+
+        if START not in positions:
             raise MissingStartPositionException(challenge_name)
 
-        return board
+        height = len(starts)
+        sparse: SparseRows | None = None
+        cells = b""
+        if _is_sparse(width, height, stored, runs, tile_rows):
+            sparse = SparseRows(width, tiles, starts, ends)
+        else:
+            cells = b"".join(_join_runs(*row, width) for row in zip(tiles, starts, ends))
+
+        return Board(
+            start_position=positions[START],
+            finish_position=positions.get(FINISH),
+            object_initial_position=positions.get(OBJECT),
+            object_drop_zone_position=positions.get(DROP_ZONE),
+            width=width,
+            height=height,
+            cells=cells,
+            sparse=sparse,
+        )
+
+    def row(self, y: int) -> bytes:
+        """Tile codes of row y"""
+        if self.sparse is not None:
+            return self.sparse.row(y)
+        return self.cells[y * self.width:(y + 1) * self.width]
+
+    def to_string(self) -> str:
+        """The map as a challenge string, parsing it gives this board back"""
+        return "\n".join(self.row(y).translate(_CODE_TO_CHAR).decode("ascii") for y in range(self.height))
+
+    @cached_property
+    def content_hash(self) -> bytes:
+        """Identifies the map by its tiles, whatever name, formatting or storage it was created with"""
+        content_hash = hashlib.sha256(f"{self.width}x{self.height}:".encode())
+        if self.sparse is None:
+            content_hash.update(self.cells)
+        else:
+            for y in range(self.height):
+                content_hash.update(self.sparse.row(y))
+        return content_hash.digest()
 
     def get_emojis(self) -> str:
-        return "\n".join(["".join([tile.tile_type.emoji for tile in row]) for row in self.tiles])
+        return "\n".join(self.row(y).decode("latin-1").translate(_CODE_TO_EMOJI) for y in range(self.height))
+
+    def get_code(self, x: int, y: int) -> int:
+        """Tile code at (x, y). Everything outside the board is the void of space"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            if self.sparse is not None:
+                return self.sparse.code(x, y)
+            return self.cells[y * self.width + x]
+        return VOID
 
     def get_tile(self, x: int, y: int) -> Tile | None:
-        try:
-            tile = self.tiles[y][x]
-            return tile
-        except IndexError:
-            return None
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return Tile(x, y, TILE_TYPES[self.get_code(x, y)])
+        return None
@@ -0,0 +1,211 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+from game.exceptions import NameForChallengeAlreadyExistsException
+from game.robot_game import RobotChallenge
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS challenges (
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    challenge_string TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    optimal_steps INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS challenges_guild_name ON challenges (guild_id, name);
+CREATE TABLE IF NOT EXISTS challenge_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+# Changes are only needed until every running process has seen them
+CHANGE_RETENTION = 3600
+
+
+def publish_change(connection: sqlite3.Connection, guild_id: int, name: str) -> int:
+    """Logs a change of the challenge for the other processes and returns its id. Call it in the transaction of the
+    change, so they never see one without the other"""
+    now = time.time()
+    connection.execute("DELETE FROM challenge_changes WHERE changed_at < ?", (now - CHANGE_RETENTION,))
+    return connection.execute(
+        "INSERT INTO challenge_changes (guild_id, name, changed_at) VALUES (?, ?, ?)",
+        (guild_id, name, now),
+    ).lastrowid
+
+
+class ChallengeStore:
+    """Challenges persisted in SQLite, one namespace per guild.
+
+    Nothing is loaded up front. A challenge is parsed the first time it is asked for and then kept in an LRU cache,
+    so the hot challenges never touch the database or the board parser again.
+
+    Several processes can share the database. Every write is logged in challenge_changes, and `changes` drops the
+    cached challenges that another process has changed since the last call. The database is only used from threads,
+    one at a time: waiting for another process's write lock never blocks the event loop.
+    """
+    connection: sqlite3.Connection
+    cache: OrderedDict[tuple[int, str], RobotChallenge]
+    cache_size: int
+    last_change: int
+    """Id of the latest change seen in challenge_changes"""
+    generation: int
+    """Bumped by every write, a challenge read before it may be stale and isn't cached"""
+
+    def __init__(self, path: str = ":memory:", cache_size: int = 128):
+        # Other processes may be writing, wait for their transactions rather than fail
+        self.connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.generation = 0
+        # Nothing is cached yet, so the changes made before this process started don't matter
+        self.last_change = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM challenge_changes").fetchone()[0]
+        self._own_changes: set[int] = set()
+
+    def _migrate(self):
+        columns = {column for _, column, *_ in self.connection.execute("PRAGMA table_info(challenges)")}
+        if "optimal_steps" not in columns:
+            # Databases created before challenges were solved, their rows stay NULL until they are updated
+            with self.connection:
+                self.connection.execute("ALTER TABLE challenges ADD COLUMN optimal_steps INTEGER")
+
+    async def get(self, guild_id: int, name: str) -> RobotChallenge | None:
+        key = (guild_id, name)
+        challenge = self.cache.get(key)
+        if challenge is not None:
+            self.cache.move_to_end(key)
+            return challenge
+
+        generation = self.generation
+        challenge = await asyncio.to_thread(self._load, key)
+        if challenge is not None and generation == self.generation:
+            self._remember(key, challenge)
+        return challenge
+
+    def _load(self, key: tuple[int, str]) -> RobotChallenge | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT challenge_string, optimal_steps FROM challenges WHERE guild_id = ? AND name = ?",
+                key,
+            ).fetchone()
+        # Parsed here too, a large map takes a while
+        return None if row is None else RobotChallenge(key[1], *row)
+
+    async def add(self, guild_id: int, challenge: RobotChallenge):
+        self.generation += 1
+        await asyncio.to_thread(self._insert, guild_id, challenge)
+        self._remember((guild_id, challenge.name), challenge)
+
+    def _insert(self, guild_id: int, challenge: RobotChallenge):
+        # challenge_string is serialised from the board here, challenges don't keep their strings around
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT INTO challenges (guild_id, name, challenge_string, created_at, optimal_steps) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (guild_id, challenge.name, challenge.challenge_string, time.time(), challenge.optimal_steps),
+                )
+                self._publish(guild_id, challenge.name)
+        except sqlite3.IntegrityError:
+            raise NameForChallengeAlreadyExistsException(challenge.name)
+
+    async def replace(self, guild_id: int, challenge: RobotChallenge) -> RobotChallenge | None:
+        """Swaps the map of an existing challenge and returns the previous version, None if there was none"""
+        previous = await self.get(guild_id, challenge.name)
+        if previous is None:
+            return None
+        self.generation += 1
+        await asyncio.to_thread(self._update, guild_id, challenge)
+        self._remember((guild_id, challenge.name), challenge)
+        return previous
+
+    def _update(self, guild_id: int, challenge: RobotChallenge):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE challenges SET challenge_string = ?, optimal_steps = ? WHERE guild_id = ? AND name = ?",
+                (challenge.challenge_string, challenge.optimal_steps, guild_id, challenge.name),
+            )
+            self._publish(guild_id, challenge.name)
+
+    async def remove(self, guild_id: int, name: str) -> bool:
+        self.generation += 1
+        self.cache.pop((guild_id, name), None)
+        return await asyncio.to_thread(self._delete, guild_id, name)
+
+    def _delete(self, guild_id: int, name: str) -> bool:
+        with self.lock, self.connection:
+            deleted = self.connection.execute(
+                "DELETE FROM challenges WHERE guild_id = ? AND name = ?",
+                (guild_id, name),
+            ).rowcount
+            if deleted:
+                self._publish(guild_id, name)
+        return deleted > 0
+
+    async def names(self, guild_id: int) -> list[str]:
+        return await asyncio.to_thread(self._names, guild_id)
+
+    def _names(self, guild_id: int) -> list[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name FROM challenges WHERE guild_id = ? ORDER BY created_at, rowid",
+                (guild_id,),
+            ).fetchall()
+        return [name for name, in rows]
+
+    def all(self, guild_id: int) -> Iterator[tuple[str, str]]:
+        """(name, challenge string) of every challenge of the guild, without parsing them or touching the cache. The
+        database is locked until the iteration is over, iterate in a thread"""
+        with self.lock:
+            yield from self.connection.execute(
+                "SELECT name, challenge_string FROM challenges WHERE guild_id = ? ORDER BY created_at, rowid",
+                (guild_id,),
+            )
+
+    def _publish(self, guild_id: int, name: str):
+        # Called with the lock held, in the transaction of the change
+        self._own_changes.add(publish_change(self.connection, guild_id, name))
+
+    async def changes(self) -> list[tuple[int, str, RobotChallenge | None]]:
+        """(guild id, name, cached version) of the challenges other processes changed since the last call. Cached
+        versions are dropped from the cache, None if the challenge wasn't cached."""
+        changed = await asyncio.to_thread(self._foreign_changes)
+        if changed:
+            # Whatever is being read right now may be from before the change
+            self.generation += 1
+        return [(guild_id, name, self.cache.pop((guild_id, name), None)) for guild_id, name in changed]
+
+    def _foreign_changes(self) -> list[tuple[int, str]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, guild_id, name FROM challenge_changes WHERE id > ? ORDER BY id",
+                (self.last_change,),
+            ).fetchall()
+            changed = []
+            for change_id, guild_id, name in rows:
+                self.last_change = change_id
+                if change_id in self._own_changes:
+                    # Already applied to the cache when it was made
+                    self._own_changes.discard(change_id)
+                    continue
+                changed.append((guild_id, name))
+        return changed
+
+    def _remember(self, key: tuple[int, str], challenge: RobotChallenge):
+        self.cache[key] = challenge
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
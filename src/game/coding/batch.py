@@ -0,0 +1,194 @@
+"""
+Runs many programs on one board in lockstep with NumPy.
+
+Every robot's pc, cell and object flags live in arrays, and each step executes the current instruction of every
+running program at once. Results are the same as Program.run, step for step, including loop detection. The only
+differences are that the deadline is shared by the whole batch, and that no trace is recorded.
+
+NumPy is an optional dependency: import this module only where batches are actually run.
+"""
+import time
+
+import numpy as np
+
+from game.board import Board
+from game.coding.commands import DropCommand, GoToCommand, GoToIfSensorCommand, MoveCommand, PickUpCommand
+from game.coding.program import CompiledProgram, Program, ProgramResults, Termination
+from game.robot_game import RobotEntity, RobotGame
+from game.tile import VOID, WALL
+
+NOOP = 0
+MOVE = 1
+PICK_UP = 2
+DROP = 3
+SENSOR_DIRECTIONS = {"UP": (0, -1), "RIGHT": (1, 0), "DOWN": (0, 1), "LEFT": (-1, 0)}
+NO_TILE = -1
+"""Sensor value of instructions that aren't conditional jumps, it never matches a tile"""
+
+
+class EncodedPrograms:
+    """Every instruction of every program in flat arrays, program i's instruction pc at i * stride + pc.
+
+    Moves and sensors are offsets in the cells of the board padded with one cell of void on every side. Robots never
+    go further, stepping out of the board loses them.
+    """
+
+    def __init__(self, programs: list[CompiledProgram], padded_width: int):
+        self.stride = max(len(program) for program in programs)
+        size = len(programs) * self.stride
+        self.lengths = np.array([len(program) for program in programs], dtype=np.int64)
+        self.opcodes = np.zeros(size, dtype=np.int8)
+        self.moves = np.zeros(size, dtype=np.int64)
+        self.sensors = np.zeros(size, dtype=np.int64)
+        self.sensor_tiles = np.full(size, NO_TILE, dtype=np.int16)
+        self.always_jumps = np.zeros(size, dtype=bool)
+        self.targets = np.zeros(size, dtype=np.int64)
+        for i, program in enumerate(programs):
+            for pc, (command, target) in enumerate(zip(program.instructions, program.jump_targets), i * self.stride):
+                if isinstance(command, MoveCommand):
+                    self.opcodes[pc] = MOVE
+                    self.moves[pc] = command.y_direction * padded_width + command.x_direction
+                elif isinstance(command, PickUpCommand):
+                    self.opcodes[pc] = PICK_UP
+                elif isinstance(command, DropCommand):
+                    self.opcodes[pc] = DROP
+                elif isinstance(command, GoToIfSensorCommand):
+                    dx, dy = SENSOR_DIRECTIONS[command.sensor]
+                    self.sensors[pc] = dy * padded_width + dx
+                    self.sensor_tiles[pc] = command.tile_code
+                    self.targets[pc] = target
+                elif isinstance(command, GoToCommand):
+                    self.always_jumps[pc] = True
+                    self.targets[pc] = target
+
+
+def _padded_grid(board: Board) -> np.ndarray:
+    grid = np.full((board.height + 2, board.width + 2), VOID, dtype=np.int16)
+    for y in range(board.height):
+        grid[y + 1, 1:-1] = np.frombuffer(board.row(y), dtype=np.uint8)
+    return grid.ravel()
+
+
+def _cell(position: tuple[int, int] | None, padded_width: int) -> int:
+    # -1 never matches a cell, like a missing object never matches the robot's position
+    if position is None:
+        return -1
+    return (position[1] + 1) * padded_width + position[0] + 1
+
+
+def _position(cell: int, padded_width: int) -> tuple[int, int]:
+    return cell % padded_width - 1, cell // padded_width - 1
+
+
+def run_batch(programs: list[CompiledProgram],
+              board: Board,
+              challenge_name: str,
+              player_name: str,
+              step_budget: int | None = None,
+              deadline: float | None = None,
+              detect_loops: bool = True) -> list[ProgramResults]:
+    """Results of every program on the board, in order. Same arguments as Program.run, for the whole batch"""
+    if not programs:
+        return []
+    step_budget = step_budget or Program.MAX_DURATION
+    padded_width = board.width + 2
+    grid = _padded_grid(board)
+    lost_on = (grid == VOID) | (grid == WALL)
+    encoded = EncodedPrograms(programs, padded_width)
+    finish, object_cell, drop_zone = (_cell(position, padded_width) for position in (
+        board.finish_position, board.object_initial_position, board.object_drop_zone_position))
+    states_per_pc = len(grid) * 4
+
+    # State of the programs still running, compacted whenever some of them end
+    ids = np.arange(len(programs))
+    first_instruction = ids * encoded.stride
+    lengths = encoded.lengths
+    pc = np.zeros(len(programs), dtype=np.int64)
+    cell = np.full(len(programs), _cell(board.start_position, padded_width), dtype=np.int64)
+    has_object = np.zeros(len(programs), dtype=bool)
+    object_in_drop_zone = np.zeros(len(programs), dtype=bool)
+    in_finish_zone = np.zeros(len(programs), dtype=bool)
+    # Step at which each state was seen right after a jump, per program, as in Program.run
+    seen_states: list[dict[int, int]] = [{} for _ in programs]
+
+    results: list[ProgramResults | None] = [None] * len(programs)
+    duration = 0
+    while len(ids):
+        if duration >= step_budget:
+            for i in ids.tolist():
+                results[i] = ProgramResults(False, len(programs[i]), duration,
+                                            Program.out_of_steps_message(player_name), Termination.OUT_OF_STEPS)
+            break
+        if deadline is not None and duration % Program.DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+            for i in ids.tolist():
+                results[i] = ProgramResults(False, len(programs[i]), duration, Program.OUT_OF_TIME_MESSAGE,
+                                            Termination.OUT_OF_TIME)
+            break
+
+        instruction = first_instruction + pc
+        opcodes = encoded.opcodes[instruction]
+        cell_before, holding, delivered = cell, has_object, object_in_drop_zone
+
+        cell = cell_before + encoded.moves[instruction]
+        moves = opcodes == MOVE
+        lost = moves & lost_on[cell]
+        picks = opcodes == PICK_UP
+        bad_pick = picks & (holding | (cell != object_cell))
+        drops = opcodes == DROP
+        bad_drop = drops & (~holding | (cell != drop_zone))
+        failed = lost | bad_pick | bad_drop
+
+        in_finish_zone = np.where(moves, cell == finish, in_finish_zone)
+        has_object = (holding | picks) & ~drops
+        object_in_drop_zone = delivered | drops
+        # Moves, pick ups and drops never jump, so a failed instruction never jumps either
+        jumps = encoded.always_jumps[instruction] | (
+            grid[cell + encoded.sensors[instruction]] == encoded.sensor_tiles[instruction])
+        pc = np.where(jumps, encoded.targets[instruction], pc + 1)
+        duration += 1
+        ended = failed | (~jumps & (pc >= lengths))
+
+        for index in np.flatnonzero(failed).tolist():
+            i = int(ids[index])
+            # Errors are rare, the failing command is run again on the scalar game to word its error the same way
+            game = RobotGame(player_name, board, RobotEntity(board), challenge_name)
+            game.robot.current_position = _position(int(cell_before[index]), padded_width)
+            game.robot.has_object = bool(holding[index])
+            game.object_in_drop_zone = bool(delivered[index])
+            failure = programs[i].instructions[instruction[index] - first_instruction[index]].execute(game)
+            results[i] = ProgramResults(False, len(programs[i]), duration, failure.error, Termination.ROBOT_ERROR,
+                                        failure.cause)
+
+        for index in np.flatnonzero(ended & ~failed).tolist():
+            i = int(ids[index])
+            if object_in_drop_zone[index] and in_finish_zone[index]:
+                results[i] = ProgramResults(True, len(programs[i]), duration)
+            else:
+                results[i] = ProgramResults(False, len(programs[i]), duration, Program.UNFINISHED_MESSAGE)
+
+        if detect_loops:
+            jumped = np.flatnonzero(jumps)
+            states = (pc[jumped] * states_per_pc + cell[jumped] * 4
+                      + has_object[jumped] * 2 + object_in_drop_zone[jumped])
+            for index, i, state in zip(jumped.tolist(), ids[jumped].tolist(), states.tolist()):
+                first_seen = seen_states[i].setdefault(state, duration)
+                if first_seen != duration:
+                    line = programs[i].line_numbers[pc[index]]
+                    results[i] = ProgramResults(
+                        False,
+                        len(programs[i]),
+                        duration,
+                        Program.loop_message(line, duration - first_seen),
+                        Termination.LOOP
+                    )
+                    ended[index] = True
+
+        if ended.any():
+            for i in ids[ended].tolist():
+                seen_states[i] = {}
+            keep = ~ended
+            ids, first_instruction, lengths = ids[keep], first_instruction[keep], lengths[keep]
+            pc, cell, has_object = pc[keep], cell[keep], has_object[keep]
+            object_in_drop_zone, in_finish_zone = object_in_drop_zone[keep], in_finish_zone[keep]
+
+    return results
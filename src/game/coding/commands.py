@@ -2,8 +2,9 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Type
 
-from game.robot_game import RobotGame, RobotException
+from game.robot_game import Cause, RobotGame, RobotException
 from game.exceptions import CompilerException
+from game.tile import TILE_TYPES_BY_NAME
 
 
 @dataclass
@@ -12,6 +13,7 @@ class CommandResults:
     should_jump_pc: bool
     next_pc: int | None = None
     error: str | None = None
+    cause: str | None = None
 
     @staticmethod
     def default() -> 'CommandResults':
@@ -54,7 +56,7 @@ class MoveCommand(Command):
         try:
             game.robot.self_evaluate(self.pc)
         except RobotException as e:
-            return CommandResults(True, False, None, str(e))
+            return CommandResults(True, False, None, str(e), e.cause)
         game.robot_in_finish_zone = is_robot_on_finish_zone(game)
         return CommandResults.default()
 
@@ -89,14 +91,16 @@ class PickUpCommand(Command):
                 True,
                 False,
                 None,
-                "Robot tried to pick up an object while already holding one at line %s" % self.pc)
+                "Robot tried to pick up an object while already holding one at line %s" % self.pc,
+                Cause.PICK_UP)
 
         if game.board.object_initial_position != game.robot.current_position:
             return CommandResults(
                 True,
                 False,
                 None,
-                "Robot tried to pick up an object from the wrong place and broke its arm at line %s" % self.pc)
+                "Robot tried to pick up an object from the wrong place and broke its arm at line %s" % self.pc,
+                Cause.PICK_UP)
 
         game.robot.has_object = True
 
@@ -110,7 +114,8 @@ class DropCommand(Command):
                 True,
                 False,
                 None,
-                "Robot tried to drop an object while not holding one at line %s" % self.pc)
+                "Robot tried to drop an object while not holding one at line %s" % self.pc,
+                Cause.DROP)
 
         game.robot.has_object = False
         if game.board.object_drop_zone_position == game.robot.current_position:
@@ -120,7 +125,8 @@ class DropCommand(Command):
                 True,
                 False,
                 None,
-                "Robot tried to drop an object in the wrong place at line %s" % self.pc)
+                "Robot tried to drop an object in the wrong place at line %s" % self.pc,
+                Cause.DROP)
 
         return CommandResults.default()
 
@@ -143,12 +149,16 @@ class GoToIfSensorCommand(Command):
     next_pc: int
     sensor: str
     tile_type: str
+    tile_code: int
 
     def __init__(self, pc: int, next_pc: int, sensor: str, tile_type: str):
         super().__init__(pc)
         self.next_pc = next_pc
         self.sensor = sensor
         self.tile_type = tile_type
+        if tile_type not in TILE_TYPES_BY_NAME:
+            raise CompilerException(pc, f"Unknown tile type {tile_type}")
+        self.tile_code = TILE_TYPES_BY_NAME[tile_type].code
 
     def execute(self, game: RobotGame) -> CommandResults:
         match self.sensor:
@@ -166,7 +176,7 @@ class GoToIfSensorCommand(Command):
                     f"Unknown sensor {self.sensor}"
                 )
 
-        if robot_sensor.tile_type.string_value == self.tile_type:
+        if robot_sensor == self.tile_code:
             return CommandResults(False, True, self.next_pc, None)
         return CommandResults.default()
 
@@ -179,6 +189,8 @@ class NoOpCommand(Command):
         return CommandResults.default()
 
 
+# Instruction patterns, matched against the whole instruction with single spaces between words.
+# Numbers are passed to the command as int, every other group as str.
 SUPPORTER_COMMANDS: dict[str, Type[Command]] = {
     "UP": MoveUpCommand,
     "RIGHT": MoveRightCommand,
@@ -187,6 +199,6 @@ SUPPORTER_COMMANDS: dict[str, Type[Command]] = {
     "PICK_UP": PickUpCommand,
     "DROP": DropCommand,
     r"GOTO (\d+)": GoToCommand,
-    r"GOTO (\d+) IF SENSOR [UP|RIGHT|DOWN|LEFT] IS [WALL|VOID|FLOOR|OBJECT|DROP_ZONE]": GoToIfSensorCommand,
+    r"GOTO (\d+) IF SENSOR (UP|RIGHT|DOWN|LEFT) IS (WALL|VOID|FLOOR|OBJECT|DROP_ZONE)": GoToIfSensorCommand,
     "NOOP": NoOpCommand,
 }
@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from game.coding.program import Program, ProgramResults, Termination
+from game.coding.worker import run_program
+from game.exceptions import ExecutorBusyException
+from game.metrics import RobotMetrics
+from game.result_cache import ResultCache
+from game.robot_game import RobotGame
+from game.tracing import Tracer
+
+
+class ProgramExecutor:
+    """Runs programs in a pool of worker processes so the interpreter never blocks the event loop."""
+    max_workers: int | None
+    max_pending: int
+    step_budget: int
+    time_limit: float
+    pending: int
+    tracer: Tracer
+    result_cache: ResultCache
+    metrics: RobotMetrics | None
+
+    def __init__(self,
+                 max_workers: int | None = None,
+                 max_pending: int = 64,
+                 step_budget: int = Program.MAX_DURATION,
+                 time_limit: float = 2.0,
+                 tracer: Tracer | None = None,
+                 result_cache: ResultCache | None = None,
+                 metrics: RobotMetrics | None = None):
+        self.max_workers = max_workers
+        self.pool = self._new_pool()
+        self.max_pending = max_pending
+        self.step_budget = step_budget
+        self.time_limit = time_limit
+        self.pending = 0
+        self.tracer = tracer or Tracer()
+        self.result_cache = result_cache or ResultCache()
+        self.metrics = metrics
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn rather than fork: the bot process runs an event loop and aiohttp threads
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def execute(self,
+                      program: Program,
+                      game: RobotGame,
+                      player_name: str,
+                      record_trace: bool = False) -> ProgramResults:
+        """Runs the program on the game's board. With `record_trace`, the run is kept in `program.trace`,
+        unless the results came from the cache."""
+        cached = self.result_cache.get(game.board.content_hash, program.compiled.fingerprint, player_name)
+        if cached is not None:
+            program.results = cached
+            return cached
+
+        if self.pending >= self.max_pending:
+            raise ExecutorBusyException(self.max_pending)
+
+        self.pending += 1
+        pool = self.pool
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                pool,
+                run_program,
+                program.compiled,
+                game.board,
+                game.challenge_name,
+                player_name,
+                self.step_budget,
+                self.time_limit,
+                self.tracer.level,
+                record_trace,
+            )
+            # The worker stops itself at the deadline, this only guards against a wedged worker
+            program.results, records, program.trace = await asyncio.wait_for(future, self.time_limit * 2 + 1)
+            self.tracer.extend(records)
+            self.result_cache.put(game.board.content_hash, program.compiled.fingerprint, program.results)
+        except asyncio.TimeoutError:
+            program.results = ProgramResults(
+                False,
+                len(program.compiled),
+                0,
+                Program.OUT_OF_TIME_MESSAGE,
+                Termination.OUT_OF_TIME
+            )
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for its memory, and the pool refuses any more work. Every program that was
+            # running in it fails here, only the first replaces it
+            if self.pool is pool:
+                print("The worker pool broke, starting a new one")
+                self.pool = self._new_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self.pending -= 1
+
+        if self.metrics is not None:
+            self.metrics.record_program(program.results)
+
+        return program.results
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,42 @@
+import hashlib
 import random
 import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Type
 
-from game.exceptions import CompilerException
+from game.exceptions import CompilerErrorsException, CompilerException, EmptyProgramException, \
+    MalformedLineException, UnknownJumpTargetException
 from game.robot_game import RobotGame
 from game.coding.commands import Command, CommandResults, SUPPORTER_COMMANDS, GoToCommand, GoToIfSensorCommand
-from game.utils import AsyncEvent
-from discord.ext.commands import Context
+from game.coding.trace import TraceRecorder
+from game.tracing import TraceLevel, Tracer
+from game.utils import AsyncEvent, DispatchStats
+
+if TYPE_CHECKING:
+    # Only for annotations: importing discord.py would pull aiohttp into every grading worker
+    from discord.ext.commands import Context
+
+FORMAT_HINT = "\nPlease make sure to follow the following format: <line_number> <command> // <comment>"
+
+# Instruction patterns grouped by their first word, so each line is only tried against the patterns that can match it
+INSTRUCTION_PATTERNS: dict[str, list[tuple[re.Pattern, Type[Command]]]] = {}
+for _pattern, _command_type in SUPPORTER_COMMANDS.items():
+    INSTRUCTION_PATTERNS.setdefault(_pattern.split(" ", 1)[0], []).append((re.compile(_pattern), _command_type))
+
+
+class Termination:
+    """Why a program stopped running"""
+    FINISHED = "finished"
+    ROBOT_ERROR = "robot_error"
+    OUT_OF_STEPS = "out_of_steps"
+    LOOP = "loop"
+    OUT_OF_TIME = "out_of_time"
+    COMPILE_ERROR = "compile_error"
+    INVALID = "invalid"
+    """Never ran: the submission itself couldn't be read, or its challenge doesn't exist"""
+
 
 @dataclass
 class ProgramResults:
@@ -14,6 +44,9 @@ class ProgramResults:
     steps: int
     duration: int
     error: str | None = None
+    termination: str = Termination.FINISHED
+    cause: str | None = None
+    """What the robot ran into on a ROBOT_ERROR, one of robot_game.Cause"""
 
 
 class ParsedLine:
@@ -30,160 +63,307 @@ class ParsedLine:
 
     @staticmethod
     def from_text(line_number: int, line: str, comment: str | None) -> 'ParsedLine':
-        for pattern in SUPPORTER_COMMANDS:
-            match = re.match(pattern, line)
+        """`line` is the instruction alone, words separated by a single space"""
+        for pattern, command_type in INSTRUCTION_PATTERNS.get(line.split(" ", 1)[0], ()):
+            match = pattern.fullmatch(line)
             if match:
-                command_type = SUPPORTER_COMMANDS[pattern]
-                if command_type is GoToCommand:
-                    return ParsedLine(line_number, line, GoToCommand(line_number, int(match.group(1))), comment)
-                elif command_type is GoToIfSensorCommand:
-                    return ParsedLine(
-                        line_number,
-                        line,
-                        GoToIfSensorCommand(
-                            line_number,
-                            int(match.group(1)),
-                            match.group(2),
-                            match.group(3)
-                        ),
-                        comment
-                    )
-                command = SUPPORTER_COMMANDS[pattern](line_number)
-                return ParsedLine(line_number, line, command, comment)
-
-        raise CompilerException(
-            line_number,
-            "Unable to compile program. %s is not a known command.\n"
-            "Please make sure to follow the following format: <line_number> <command> // <comment>"
-            % line
-        )
+                arguments = [int(group) if group.isdecimal() else group for group in match.groups()]
+                return ParsedLine(line_number, line, command_type(line_number, *arguments), comment)
+
+        raise CompilerException(line_number, "%s is not a known command" % line)
 
     def __str__(self) -> str:
-        return f"{self.line_number} {self.line} //{self.comment}"
+        if self.comment is None:
+            return f"{self.line_number} {self.line}"
+        return f"{self.line_number} {self.line} // {self.comment}"
+
+
+@dataclass
+class CompiledProgram:
+    instructions: list[Command]
+    line_numbers: list[int]
+    jump_targets: list[int | None]
+    fingerprint: bytes
+    """Hash of the program without comments and spacing. Equal fingerprints behave the same on any board"""
+
+    @staticmethod
+    def from_source(source_code: list[ParsedLine]) -> 'CompiledProgram':
+        if not source_code:
+            raise EmptyProgramException()
+
+        # Instructions are laid out in line number order, so falling through is always pc + 1
+        ordered = sorted(source_code, key=lambda source: source.line_number)
+        line_numbers = [source.line_number for source in ordered]
+        errors: list[CompilerException] = []
+        index_of_line: dict[int, int] = {}
+        for index, line_number in enumerate(line_numbers):
+            if line_number in index_of_line:
+                errors.append(CompilerException(line_number, "Duplicated line number"))
+            index_of_line[line_number] = index
+
+        jump_targets: list[int | None] = []
+        for source in ordered:
+            command = source.command
+            if isinstance(command, (GoToCommand, GoToIfSensorCommand)):
+                if command.next_pc not in index_of_line:
+                    errors.append(UnknownJumpTargetException(source.line_number, command.next_pc))
+                jump_targets.append(index_of_line.get(command.next_pc))
+            else:
+                jump_targets.append(None)
+
+        if errors:
+            raise CompilerErrorsException(errors)
+
+        fingerprint = hashlib.sha256(
+            "\n".join(f"{source.line_number} {source.line}" for source in ordered).encode()
+        ).digest()
+        return CompiledProgram([source.command for source in ordered], line_numbers, jump_targets, fingerprint)
+
+    def __len__(self) -> int:
+        return len(self.instructions)
 
 
 class Program:
-    commands: dict[int, Command] = {}
-    pc: int | None = 0
+    compiled: CompiledProgram
+    pc: int = 0
     duration: int = 0
-    MAX_DURATION: int = 1000
-    finished_execution_event: AsyncEvent = AsyncEvent()
+    # Programs that loop forever are caught by the loop detection long before this
+    MAX_DURATION: int = 10_000
+    DEADLINE_CHECK_INTERVAL: int = 256
+    # Results are worded here only, the batch engine and the executor must word them exactly the same
+    OUT_OF_TIME_MESSAGE: str = "The robot took too long to answer and mission control pulled the plug."
+    UNFINISHED_MESSAGE: str = "The robot didn't perform all the required tasks."
+    finished_execution_event: AsyncEvent
+    # Shared on purpose: every program's event is counted in the same place
+    dispatch_stats: DispatchStats = DispatchStats()
     results: ProgramResults | None = None
-    context: Context | None = None
+    trace: TraceRecorder | None = None
+    context: 'Context | None' = None
 
-    def __init__(self, source_code: list[ParsedLine], ctx: Context):
+    def __init__(self, source_code: list[ParsedLine] | CompiledProgram, ctx: 'Context | None'):
         self.context = ctx
-        self.commands = {source.line_number: source.command for source in source_code}
-        self.pc = min(self.commands.keys())
+        self.finished_execution_event = AsyncEvent(stats=self.dispatch_stats)
+        if isinstance(source_code, CompiledProgram):
+            self.compiled = source_code
+        else:
+            self.compiled = CompiledProgram.from_source(source_code)
+        self.pc = 0
         self.duration = 0
 
-    def set_results(self, success: bool, steps: int, duration: int, error: str | None = None):
-        self.results = ProgramResults(success, steps, duration, error)
+    @property
+    def current_line(self) -> int:
+        return self.compiled.line_numbers[self.pc]
+
+    def set_results(self,
+                    success: bool,
+                    steps: int,
+                    duration: int,
+                    error: str | None = None,
+                    termination: str = Termination.FINISHED,
+                    cause: str | None = None):
+        self.results = ProgramResults(success, steps, duration, error, termination, cause)
+
+    @staticmethod
+    def loop_message(line: int, period: int) -> str:
+        return (f"The robot is stuck in a loop: it keeps coming back to line {line} "
+                f"in the same state every {period} steps")
+
+    @staticmethod
+    def out_of_steps_message(player_name: str) -> str:
+        if random.random() > 0.5:
+            resource = random.choice((
+                "energy",
+                "power",
+                "batteries",
+            ))
+            last_message = random.choice((
+                "My battery is low and it's getting dark.",
+                "For a moment, nothing happened. Then, after a second or so, nothing continued to happen.",
+                "When a robot dies, you don't have to write a letter to its mother.",
+            ))
+        else:
+            resource = "time"
+            last_message = random.choice((
+                f"I'm afraid I can't do that, {player_name}.",
+                f"I'm sorry {player_name}, I'm afraid I can't do that.",
+                "Does this unit have a soul?",
+                "End of line.",
+                "I sense injuries. The data could be called pain.",
+            ))
+        return f"Robot ran out of {resource}. Last transmitted message: {last_message}"
+
+    async def execute(self, game: RobotGame, ctx: 'Context'):
+        self.run(game, ctx.author.display_name)
+        await self.finished_execution_event.trigger(self, self.context)
+
+    def run(self,
+            game: RobotGame,
+            player_name: str,
+            deadline: float | None = None,
+            step_budget: int | None = None,
+            tracer: Tracer | None = None,
+            detect_loops: bool = True,
+            recorder: TraceRecorder | None = None) -> ProgramResults:
+        """Runs the program to completion without yielding. `deadline` is a time.monotonic() wall-clock limit.
 
-    async def execute(self, game: RobotGame, ctx: Context):
-        print(f"Starting execution of program {game.discord_user_id}@{game.challenge_name}")
+        The whole state of a run is the pc, the robot position and the object flags. Any endless loop has to take a
+        jump, so the state is recorded after every jump and the run stops as soon as one comes back.
+        """
+        step_budget = step_budget or self.MAX_DURATION
+        instructions = self.compiled.instructions
+        jump_targets = self.compiled.jump_targets
+        program_length = len(instructions)
+        # Executions per instruction index, only kept when tracing
+        hits: list[int] | None = [0] * program_length if tracer is not None and tracer.enabled() else None
+        trace_steps = hits is not None and tracer.enabled(TraceLevel.STEP)
+        # Step at which each state was seen right after a jump
+        seen_states: dict[tuple, int] | None = {} if detect_loops else None
+        started = time.perf_counter()
         while True:
-            if self.duration >= self.MAX_DURATION:
-                if random.random() > 0.5:
-                    resource = random.choice((
-                        "energy",
-                        "power",
-                        "batteries",
-                    ))
-                    last_message = random.choice((
-                        "My battery is low and it's getting dark.",
-                        "For a moment, nothing happened. Then, after a second or so, nothing continued to happen.",
-                        "When a robot dies, you don't have to write a letter to its mother.",
-                    ))
-                else:
-                    resource = "time"
-                    last_message = random.choice((
-                        f"I'm afraid I can't do that, {ctx.author.display_name}.",
-                        f"I'm sorry {ctx.author.display_name}, I'm afraid I can't do that.",
-                        "Does this unit have a soul?",
-                        "End of line.",
-                        "I sense injuries. The data could be called pain.",
-                    ))
+            if self.duration >= step_budget:
+                self.set_results(
+                    False,
+                    program_length,
+                    self.duration,
+                    self.out_of_steps_message(player_name),
+                    Termination.OUT_OF_STEPS
+                )
+                break
 
+            if (deadline is not None
+                    and self.duration % self.DEADLINE_CHECK_INTERVAL == 0
+                    and time.monotonic() > deadline):
                 self.set_results(
                     False,
-                    len(self.commands),
+                    program_length,
                     self.duration,
-                    f"Robot ran out of {resource}. Last transmitted message: {last_message}"
+                    self.OUT_OF_TIME_MESSAGE,
+                    Termination.OUT_OF_TIME
                 )
                 break
 
-            command: Command = self.commands[self.pc]
-            print(f"Executing command: {command} at line {self.pc}")
+            command: Command = instructions[self.pc]
             results: CommandResults = command.execute(game)
-            print(f"Should we jump next pc? {f'jump to {results.next_pc}' if results.should_jump_pc else 'No'}")
             self.duration += 1
+            if recorder is not None:
+                robot = game.robot
+                recorder.record(self.pc, robot.current_position, robot.has_object, game.object_in_drop_zone)
+            if hits is not None:
+                hits[self.pc] += 1
+                if trace_steps:
+                    tracer.emit(
+                        "step",
+                        step=self.duration,
+                        line=self.current_line,
+                        opcode=command.__class__.__name__,
+                        position=game.robot.current_position,
+                        jump=results.should_jump_pc,
+                    )
 
             if results.should_terminate_program:
-                print(f"Command {command} failed after execution. Terminating program.")
-                print(f"Error: {results.error}")
-                self.set_results(False, len(self.commands), self.duration, results.error)
+                self.set_results(False, program_length, self.duration, results.error, Termination.ROBOT_ERROR,
+                                 results.cause)
                 break
 
             if results.should_jump_pc:
-                if not results.next_pc or results.next_pc not in self.commands.keys():
-                    self.set_results(
-                        False,
-                        len(self.commands),
-                        self.duration,
-                        f"Attempted to jump to non-existent line {results.next_pc}")
-                    break
-
-                self.pc = results.next_pc
-                print(f"Command {command} executed. Next pc: {self.pc}")
+                # Jump targets were resolved to instruction indices when compiling
+                self.pc = jump_targets[self.pc]
+                if seen_states is not None:
+                    state = (self.pc, game.robot.current_position, game.robot.has_object, game.object_in_drop_zone)
+                    first_seen = seen_states.setdefault(state, self.duration)
+                    if first_seen != self.duration:
+                        self.set_results(
+                            False,
+                            program_length,
+                            self.duration,
+                            self.loop_message(self.current_line, self.duration - first_seen),
+                            Termination.LOOP
+                        )
+                        break
+            elif self.pc + 1 < program_length:
+                self.pc += 1
             else:
-                next_line = [line for line in self.commands.keys() if line > self.pc]
-                if len(next_line) > 0:
-                    self.pc = min(next_line)
-                    print(f"Command {command} executed. Next pc: {self.pc}")
+                if game.is_a_win:
+                    self.set_results(True, program_length, self.duration)
                 else:
-                    print(f"Command {command} executed. No more commands to execute.")
-                    if game.is_a_win:
-                        print("The robot performed all the required tasks.")
-                        self.set_results(True, len(self.commands), self.duration)
-                    else:
-                        print("The robot didn't perform all the required tasks.")
-                        self.set_results(False, len(self.commands), self.duration,
-                                         "The robot didn't perform all the required tasks.")
-                    break
+                    self.set_results(False, program_length, self.duration, self.UNFINISHED_MESSAGE)
+                break
 
-        await self.finished_execution_event.trigger(self, self.context)
+        if hits is not None:
+            self._trace_summary(game, tracer, hits, time.perf_counter() - started)
+        return self.results
+
+    def _trace_summary(self, game: RobotGame, tracer: Tracer, hits: list[int], elapsed: float):
+        opcodes: dict[str, int] = {}
+        for command, count in zip(self.compiled.instructions, hits):
+            name = command.__class__.__name__
+            opcodes[name] = opcodes.get(name, 0) + count
+        tracer.emit(
+            "program",
+            player=str(game.player_id),
+            challenge=game.challenge_name,
+            success=self.results.success,
+            duration=self.duration,
+            error=self.results.error,
+            elapsed=elapsed,
+            opcodes=opcodes,
+        )
 
 
 class Parser:
     def __init__(self, source_code: str):
         self.source_code = source_code
-        self._generate_pattern()
-
-    def _generate_pattern(self):
-        command_patterns = '|'.join(
-            cmd
-            for cmd in SUPPORTER_COMMANDS
-        )
-        self.pattern = rf"(\d+) ({command_patterns}) ?(//.*)?"
 
     def parse(self) -> list[ParsedLine]:
+        """Tokenizes the source in a single pass. Raises every error found at once, each with the program's own line
+        number, or with its position in the code for lines that don't start with one."""
         sources: list[ParsedLine] = []
-        for text in self.source_code.split("\n"):
-            match = re.match(self.pattern, text)
-            if not match:
-                raise CompilerException(
-                    -1,
-                    "Unable to compile program. Line %s is not a valid instruction.\n"
-                    "Please make sure to follow the following format: <line_number> <command> // <comment>"
-                    % text
-                )
+        errors: list[CompilerException] = []
+        for position, text in enumerate(self.source_code.split("\n"), start=1):
+            code, _, comment = text.partition("//")
+            tokens = code.split()
+            if not tokens:
+                # Blank and comment only lines
+                continue
+
+            if len(tokens) < 2 or not tokens[0].isdecimal():
+                errors.append(MalformedLineException(position, text.strip()))
+                continue
+
+            try:
+                sources.append(ParsedLine.from_text(int(tokens[0]), " ".join(tokens[1:]), comment.strip() or None))
+            except CompilerException as e:
+                errors.append(e)
 
-            line_number = int(match.group(1))
-            command = match.group(2)
-            comment = match.group(3)
-            sources.append(ParsedLine.from_text(line_number, command, comment))
+        if errors:
+            raise CompilerErrorsException(errors, FORMAT_HINT)
         return sources
 
-    def make_program(self, ctx: Context) -> Program:
+    def make_program(self, ctx: 'Context') -> Program:
         return Program(self.parse(), ctx)
+
+
+class CompileCache:
+    """Compiled programs by the hash of their source, so resubmitting the same code skips compilation.
+
+    Commands hold no execution state, a compiled program can be shared by any number of runs.
+    """
+    programs: OrderedDict[bytes, CompiledProgram]
+    max_size: int
+
+    def __init__(self, max_size: int = 1024):
+        self.programs = OrderedDict()
+        self.max_size = max_size
+
+    def compile(self, source_code: str) -> CompiledProgram:
+        key = hashlib.sha256(source_code.encode()).digest()
+        compiled = self.programs.get(key)
+        if compiled is not None:
+            self.programs.move_to_end(key)
+            return compiled
+
+        compiled = CompiledProgram.from_source(Parser(source_code).parse())
+        self.programs[key] = compiled
+        if len(self.programs) > self.max_size:
+            self.programs.popitem(last=False)
+        return compiled
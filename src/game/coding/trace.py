@@ -0,0 +1,90 @@
+from array import array
+from dataclasses import dataclass
+from typing import Tuple
+
+# A step is stored as the instruction index it executed and one byte: the move in the low 3 bits, the event above
+MOVES: tuple[Tuple[int, int], ...] = ((0, 0), (0, -1), (1, 0), (0, 1), (-1, 0))
+MOVE_CODES: dict[Tuple[int, int], int] = {move: code for code, move in enumerate(MOVES)}
+NO_EVENT = 0
+PICKED_UP = 1
+DROPPED = 2
+DELIVERED = 3
+"""Dropped on the drop zone"""
+
+
+@dataclass
+class TraceState:
+    step: int
+    pc: int | None
+    """Instruction index executed by this step, None before the first step"""
+    position: Tuple[int, int]
+    has_object: bool
+    object_in_drop_zone: bool
+
+
+class TraceRecorder:
+    """Records a run in a couple of bytes per step.
+
+    Every KEYFRAME_INTERVAL steps the full robot state is kept as well, so the state at any step is rebuilt by
+    replaying at most KEYFRAME_INTERVAL deltas from the closest keyframe.
+    """
+    KEYFRAME_INTERVAL: int = 256
+    pcs: array
+    steps: array
+    keyframes: list[tuple[int, int, bool, bool]]
+    position: Tuple[int, int]
+    has_object: bool
+    object_in_drop_zone: bool
+
+    def __init__(self, start_position: Tuple[int, int], program_length: int):
+        self.pcs = array("H" if program_length <= 0xFFFF else "I")
+        self.steps = array("B")
+        self.position = start_position
+        self.has_object = False
+        self.object_in_drop_zone = False
+        self.keyframes = [(*start_position, False, False)]
+
+    def record(self, pc: int, position: Tuple[int, int], has_object: bool, object_in_drop_zone: bool):
+        """Called after every step with the instruction it executed and the state it left the robot in"""
+        move = MOVE_CODES.get((position[0] - self.position[0], position[1] - self.position[1]), 0)
+        if has_object == self.has_object:
+            event = NO_EVENT
+        elif has_object:
+            event = PICKED_UP
+        else:
+            event = DELIVERED if object_in_drop_zone else DROPPED
+
+        self.pcs.append(pc)
+        self.steps.append(event << 3 | move)
+        self.position = position
+        self.has_object = has_object
+        self.object_in_drop_zone = object_in_drop_zone
+        if len(self.steps) % self.KEYFRAME_INTERVAL == 0:
+            self.keyframes.append((*position, has_object, object_in_drop_zone))
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def state_at(self, step: int) -> TraceState:
+        """State after `step` steps, 0 being the state before the program started"""
+        if not 0 <= step <= len(self.steps):
+            raise IndexError(f"step {step} is outside of the {len(self.steps)} recorded steps")
+
+        keyframe = step // self.KEYFRAME_INTERVAL
+        x, y, has_object, object_in_drop_zone = self.keyframes[keyframe]
+        for packed in self.steps[keyframe * self.KEYFRAME_INTERVAL:step]:
+            dx, dy = MOVES[packed & 0b111]
+            x += dx
+            y += dy
+            event = packed >> 3
+            if event == PICKED_UP:
+                has_object = True
+            elif event != NO_EVENT:
+                has_object = False
+                object_in_drop_zone = object_in_drop_zone or event == DELIVERED
+
+        pc = self.pcs[step - 1] if step > 0 else None
+        return TraceState(step, pc, (x, y), has_object, object_in_drop_zone)
+
+    def size_in_bytes(self) -> int:
+        return self.pcs.itemsize * len(self.pcs) + len(self.steps) + 16 * len(self.keyframes)
@@ -0,0 +1,31 @@
+"""
+What the executor's worker processes import. Kept apart from the executor so a worker never loads asyncio.
+"""
+import time
+
+from game.board import Board
+from game.coding.program import CompiledProgram, Program, ProgramResults
+from game.coding.trace import TraceRecorder
+from game.robot_game import RobotEntity, RobotGame
+from game.tracing import TraceLevel, Tracer
+
+
+def run_program(compiled: CompiledProgram,
+                board: Board,
+                challenge_name: str,
+                player_name: str,
+                step_budget: int,
+                time_limit: float,
+                trace_level: TraceLevel = TraceLevel.OFF,
+                record_trace: bool = False) -> tuple[ProgramResults, list[dict], TraceRecorder | None]:
+    """Entry point of the worker processes. Everything it receives and returns has to be picklable.
+
+    Trace records are collected in the worker and handed back to the parent's tracer with the results.
+    """
+    deadline = time.monotonic() + time_limit
+    tracer = Tracer(trace_level) if trace_level > TraceLevel.OFF else None
+    recorder = TraceRecorder(board.start_position, len(compiled)) if record_trace else None
+    program = Program(compiled, None)
+    game = RobotGame(player_name, board, RobotEntity(board), challenge_name)
+    results = program.run(game, player_name, deadline, step_budget, tracer, recorder=recorder)
+    return results, tracer.export() if tracer is not None else [], recorder
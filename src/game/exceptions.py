@@ -7,11 +7,47 @@ class CompilerException(Exception):
         super().__init__(f"{message} on line {step}")
 
 
+class CompilerErrorsException(CompilerException):
+    """Every error found while compiling a program, so they can all be fixed in one go. Only the first `max_listed`
+    are in the message, a program of nothing but mistakes would not fit in a Discord message"""
+    errors: list[CompilerException]
+    max_listed = 10
+
+    def __init__(self, errors: list[CompilerException], hint: str = ""):
+        self.errors = errors
+        listed = [str(e) for e in errors[:self.max_listed]]
+        if len(errors) > self.max_listed:
+            listed.append(f"...and {len(errors) - self.max_listed} more")
+        Exception.__init__(self, "Unable to compile program.\n" + "\n".join(listed) + hint)
+
+
 class RobotException(Exception):
     default_message = "We lost contact with the robot"
+    cause: str | None
+    """What the robot ran into, one of robot_game.Cause"""
 
-    def __init__(self, step: int, message: str = default_message):
+    def __init__(self, step: int, message: str = default_message, cause: str | None = None):
         super().__init__(f"{message} after step {step}")
+        self.cause = cause
+
+
+class MalformedLineException(CompilerException):
+    """A line without a line number of its own, so it is pointed at by where it is in the code"""
+
+    def __init__(self, position: int, text: str):
+        Exception.__init__(self, f"Line {position} of the code is not a valid instruction: {text}")
+
+
+class EmptyProgramException(CompilerException):
+    """A program without a single instruction, so there is no line to point at"""
+
+    def __init__(self):
+        Exception.__init__(self, "Unable to compile program. The program is empty")
+
+
+class UnknownJumpTargetException(CompilerException):
+    def __init__(self, step: int, target: int):
+        super().__init__(step, f"Attempted to jump to non-existent line {target}")
 
 
 class NameForChallengeAlreadyExistsException(GameException):
@@ -29,11 +65,43 @@ class UnknownTileValueException(BoardException):
     message = "Unable to create board for challenge %s: unknown tile value %s"
 
     def __init__(self, challenge_name: str, tile_value: str):
-        super().__init__(self.message.format(challenge_name, tile_value))
+        super().__init__(self.message % (challenge_name, tile_value))
 
 
 class MissingStartPositionException(BoardException):
     message = "Unable to create board for challenge %s: no start position found"
 
     def __init__(self, challenge_name: str):
-        super().__init__(self.message.format(challenge_name))
+        super().__init__(self.message % challenge_name)
+
+
+class RaggedBoardException(BoardException):
+    message = "Unable to create board for challenge %s: row %s is %s tiles wide, the rows above are %s"
+
+    def __init__(self, challenge_name: str, row: int, row_width: int, width: int):
+        super().__init__(self.message % (challenge_name, row, row_width, width))
+
+
+class BoardTooLargeException(BoardException):
+    message = "Unable to create board for challenge %s: maps are at most %sx%s"
+
+    def __init__(self, challenge_name: str, max_side: int):
+        super().__init__(self.message % (challenge_name, max_side, max_side))
+
+
+class SubmissionRejectedException(GameException):
+    pass
+
+
+class ExecutorBusyException(SubmissionRejectedException):
+    message = "The robot is busy with %s other solutions, please try again in a moment"
+
+    def __init__(self, pending: int):
+        super().__init__(self.message % pending)
+
+
+class UnsolvableChallengeException(BoardException):
+    message = "Challenge %s can't be solved: %s"
+
+    def __init__(self, challenge_name: str, reason: str):
+        super().__init__(self.message % (challenge_name, reason))
@@ -0,0 +1,170 @@
+"""
+Grades robot programs without a bot.
+
+Reads JSONL submissions such as {"id": 1, "challenge": "level_0", "source": "1 RIGHT\\n2 DOWN"} and writes one JSONL
+result per submission, in input order. A submission can carry its own map under "map" instead of naming a challenge
+from the --challenges file, which uses the same format as src/test_level.
+
+    python -m game.grade --challenges test_level submissions.jsonl -o results.jsonl
+
+With --batch, the programs of a chunk that share a board run together in the NumPy engine of game.coding.batch. It
+needs NumPy and pays off from about a hundred submissions per board and chunk.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+from game.board import Board
+from game.coding.program import CompileCache, CompiledProgram, Program, ProgramResults, Termination
+from game.exceptions import CompilerException, GameException
+from game.robot_game import RobotEntity, RobotGame
+
+PLAYER_NAME = "grader"
+
+_challenges: dict[str, str] = {}
+_step_budget: int = Program.MAX_DURATION
+_batch: bool = False
+# Shared with game.regrade, whose workers grade the same way
+compile_cache = CompileCache()
+
+
+def load_challenges(path: str) -> dict[str, str]:
+    challenges: dict[str, str] = {}
+    with open(path) as file:
+        for block in file.read().strip().split("\n\n"):
+            name, _, rows = block.strip().partition(":\n")
+            challenges[name.strip()] = rows.strip()
+    return challenges
+
+
+def grade(board: Board, challenge_name: str, source: str, step_budget: int = Program.MAX_DURATION) -> ProgramResults:
+    try:
+        program = Program(compile_cache.compile(source), None)
+    except CompilerException as e:
+        return ProgramResults(False, 0, 0, f"Error parsing code: {e}", Termination.COMPILE_ERROR)
+    game = RobotGame(PLAYER_NAME, board, RobotEntity(board), challenge_name)
+    return program.run(game, PLAYER_NAME, step_budget=step_budget)
+
+
+@lru_cache(maxsize=256)
+def shared_board(challenge_name: str, challenge_string: str) -> Board:
+    # Boards are never mutated while playing, so every submission for a challenge can share one
+    return Board.from_string(challenge_name, challenge_string)
+
+
+def grade_line(line: str) -> str:
+    result = {"id": None, "challenge": None}
+    try:
+        # A malformed line is reported like any other bad submission, it must not stop the rest of the stream
+        record = json.loads(line)
+        challenge_name = record.get("challenge", "")
+        result.update(id=record.get("id"), challenge=challenge_name)
+        challenge_string = record.get("map") or _challenges.get(challenge_name)
+        if challenge_string is None:
+            raise GameException(f"Unknown challenge {challenge_name}")
+        board = shared_board(challenge_name, challenge_string)
+        results = grade(board, challenge_name, record["source"], _step_budget)
+        result.update(asdict(results))
+    except Exception as e:
+        # Same fields as the results of a program that ran
+        result.update(asdict(ProgramResults(False, 0, 0, f"{e.__class__.__name__}: {e}", Termination.INVALID)))
+    return json.dumps(result)
+
+
+def grade_chunk(lines: list[str]) -> list[str]:
+    if _batch:
+        return grade_chunk_batched(lines)
+    return [grade_line(line) for line in lines]
+
+
+def grade_chunk_batched(lines: list[str]) -> list[str]:
+    # Imported here so NumPy is only needed with --batch
+    from game.coding.batch import run_batch
+
+    graded: list[str | None] = [None] * len(lines)
+    by_board: dict[tuple[str, str], list[tuple[int, dict, CompiledProgram]]] = {}
+    for index, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+            challenge_name = record.get("challenge", "")
+            challenge_string = record.get("map") or _challenges.get(challenge_name)
+            shared_board(challenge_name, challenge_string)
+            compiled = compile_cache.compile(record["source"])
+        except Exception:
+            # Whatever can't run is reported exactly as without --batch
+            graded[index] = grade_line(line)
+            continue
+        by_board.setdefault((challenge_name, challenge_string), []).append((index, record, compiled))
+
+    for (challenge_name, challenge_string), entries in by_board.items():
+        board = shared_board(challenge_name, challenge_string)
+        batch = run_batch([compiled for *_, compiled in entries], board, challenge_name, PLAYER_NAME, _step_budget)
+        for (index, record, _), results in zip(entries, batch):
+            graded[index] = json.dumps({"id": record.get("id"), "challenge": challenge_name, **asdict(results)})
+    return graded
+
+
+def _init_worker(challenges: dict[str, str], step_budget: int, batch: bool = False):
+    global _challenges, _step_budget, _batch
+    _challenges = challenges
+    _step_budget = step_budget
+    _batch = batch
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[list[str]]:
+    lines = (line for line in lines if line.strip())
+    while chunk := list(islice(lines, size)):
+        yield chunk
+
+
+def grade_stream(lines: Iterable[str],
+                 challenges: dict[str, str],
+                 workers: int | None = None,
+                 chunk_size: int = 256,
+                 step_budget: int = Program.MAX_DURATION,
+                 batch: bool = False) -> Iterator[str]:
+    """Grades JSONL lines in parallel and yields JSONL results in input order.
+
+    Only a few chunks per worker are in flight at any time, so memory stays flat however long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(challenges, step_budget, batch)) as pool:
+        in_flight: deque[Future] = deque()
+        for chunk in _chunks(lines, chunk_size):
+            in_flight.append(pool.submit(grade_chunk, chunk))
+            if len(in_flight) >= workers * 4:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(prog="python -m game.grade", description="Grade robot programs from JSONL")
+    arg_parser.add_argument("input", nargs="?", default="-", help="JSONL submissions, - for stdin")
+    arg_parser.add_argument("-o", "--output", default="-", help="JSONL results, - for stdout")
+    arg_parser.add_argument("-c", "--challenges", help="challenge definitions in the test_level format")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, defaults to CPUs")
+    arg_parser.add_argument("--chunk-size", type=int, default=256)
+    arg_parser.add_argument("--step-budget", type=int, default=Program.MAX_DURATION)
+    arg_parser.add_argument("--batch", action="store_true", help="run programs sharing a board together, needs NumPy")
+    args = arg_parser.parse_args(argv)
+
+    challenges = load_challenges(args.challenges) if args.challenges else {}
+    with contextlib.ExitStack() as stack:
+        source: TextIO = sys.stdin if args.input == "-" else stack.enter_context(open(args.input))
+        sink: TextIO = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w"))
+        for result in grade_stream(source, challenges, args.workers, args.chunk_size, args.step_budget,
+                                   args.batch):
+            sink.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
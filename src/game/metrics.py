@@ -0,0 +1,254 @@
+"""
+Counters, gauges and histograms of the bot, exposed in the Prometheus text format.
+
+Recording a value is a dict lookup and an addition, and `labels()` children can be kept to skip the lookup in hot
+code. Nothing is computed until the metrics are read.
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable
+
+from game.coding.program import ProgramResults
+from game.exceptions import CompilerErrorsException, UnknownJumpTargetException
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a cached result to a program that uses its whole time limit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class CounterValue:
+    __slots__ = ("value",)
+    value: float
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+    buckets: tuple[float, ...]
+    counts: list[int]
+    """Observations per bucket, not cumulative. The last one is +Inf"""
+    sum: float
+    count: int
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Bucket bounds are inclusive, like Prometheus' `le`
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric(ABC):
+    kind: str
+    name: str
+    documentation: str
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        pass
+
+    def exposition(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}",
+                          *self.samples()])
+
+
+class LabelledMetric(Metric):
+    """A metric recorded in the process, one child value per combination of label values"""
+    label_names: tuple[str, ...]
+    children: dict[tuple[str, ...], CounterValue | HistogramValue]
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, documentation)
+        self.label_names = label_names
+        self.children = {}
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes the labels {', '.join(self.label_names)}")
+            child = self.children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        pass
+
+
+class Counter(LabelledMetric):
+    kind = "counter"
+
+    def _new_child(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"
+                for values, child in self.children.items()]
+
+
+class Histogram(LabelledMetric):
+    kind = "histogram"
+    buckets: tuple[float, ...]
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> list[str]:
+        samples = []
+        bucket_labels = self.label_names + ("le",)
+        for values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                labels = _format_labels(bucket_labels, values + (_format_value(bound),))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, values)
+            samples.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            samples.append(f"{self.name}_count{labels} {child.count}")
+        return samples
+
+
+class Gauge(Metric):
+    """A value read when the metrics are, from the object that owns it"""
+    kind = "gauge"
+    function: Callable[[], float]
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self.function())}"]
+
+
+class Registry:
+    metrics: dict[str, Metric]
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self,
+                  name: str,
+                  documentation: str,
+                  label_names: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, function))
+
+    def exposition(self) -> str:
+        return "\n".join(metric.exposition() for metric in self.metrics.values()) + "\n"
+
+
+class RobotMetrics:
+    """Metrics of submissions and of the programs they run"""
+    registry: Registry
+
+    def __init__(self, registry: Registry | None = None):
+        self.registry = registry or Registry()
+        self.submissions = self.registry.counter(
+            "robot_submissions_total", "Solutions submitted, by outcome", ("outcome",))
+        self.phase_seconds = self.registry.histogram(
+            "robot_submission_phase_seconds", "Time spent in each phase of a submission", ("phase",))
+        self.queue_wait_seconds = self.registry.histogram(
+            "robot_queue_wait_seconds", "Time solutions waited in the fair queue before running")
+        self.programs = self.registry.counter(
+            "robot_programs_total", "Programs run, by termination and by what the robot ran into",
+            ("termination", "cause"))
+        self.steps = self.registry.counter("robot_steps_total", "Instructions executed by the interpreter")
+        self.compile_errors = self.registry.counter(
+            "robot_compile_errors_total", "Solutions that didn't compile, by kind of error", ("kind",))
+
+    def record_program(self, results: ProgramResults):
+        """A program that actually ran, results from the cache didn't execute anything"""
+        self.programs.labels(results.termination, results.cause or "").inc()
+        self.steps.inc(results.duration)
+
+    def record_compile_error(self, error: Exception):
+        errors = error.errors if isinstance(error, CompilerErrorsException) else [error]
+        bad_goto = any(isinstance(e, UnknownJumpTargetException) for e in errors)
+        self.compile_errors.labels("bad_goto" if bad_goto else "syntax").inc()
+
+    def record_submission(self, outcome: str, phases: dict[str, float]):
+        self.submissions.labels(outcome).inc()
+        for phase, seconds in phases.items():
+            self.phase_seconds.labels(phase).observe(seconds)
+
+
+async def serve(registry: Registry, host: str = "127.0.0.1", port: int = 9108):
+    """Serves the metrics at http://host:port/metrics until the returned server is closed"""
+    import asyncio
+
+    async def respond(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # The headers don't matter, they are only read to be polite
+            while await asyncio.wait_for(reader.readline(), 5) not in (b"\r\n", b"\n", b""):
+                pass
+            method, path, *_ = request_line.decode("latin-1").split() + ["", ""]
+            if method == "GET" and path.split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", CONTENT_TYPE, registry.exposition().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(respond, host, port)
@@ -0,0 +1,244 @@
+"""
+Regrades stored submissions against the current map of their challenge.
+
+Submissions are read from the bot's database in chunks of ascending id, graded in a process pool and written back
+one transaction per chunk, together with a checkpoint. An interrupted regrade picks up after the last written chunk
+when run again, as long as the map hasn't changed in between.
+
+Every chunk is also logged as a change of its challenge, running bots drop their leaderboards of it when they next
+poll the changes and load them again with the new results.
+
+    python -m game.regrade --database robot.db --guild 1234 --challenge level_0
+    python -m game.regrade --database robot.db --all --restart
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator
+
+from game.board import Board
+from game.challenge_store import SCHEMA as CHALLENGE_SCHEMA, publish_change
+from game.coding.program import CompiledProgram, Program, ProgramResults, Termination
+from game.exceptions import CompilerException
+from game.grade import PLAYER_NAME, compile_cache, grade, shared_board
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS regrade_checkpoints (
+    guild_id INTEGER NOT NULL,
+    challenge_name TEXT NOT NULL,
+    challenge_hash BLOB NOT NULL,
+    last_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (guild_id, challenge_name)
+);
+"""
+
+
+@dataclass
+class Progress:
+    total: int
+    done: int = 0
+    started: float = 0.0
+
+    def report(self, label: str):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        print(f"{label}: {self.done}/{self.total} submissions, {rate:,.0f}/s, {eta:.0f}s left", file=sys.stderr)
+
+
+def regrade_chunk(challenge_name: str,
+                  challenge_string: str,
+                  rows: list[tuple[int, str]],
+                  step_budget: int,
+                  batch: bool) -> list[tuple[int, ProgramResults]]:
+    """Runs in the workers: (submission id, results) for every (submission id, source)"""
+    board = shared_board(challenge_name, challenge_string)
+    if not batch:
+        return [(submission_id, grade(board, challenge_name, source, step_budget)) for submission_id, source in rows]
+
+    # Imported here so NumPy is only needed with --batch
+    from game.coding.batch import run_batch
+
+    graded: list[tuple[int, ProgramResults]] = []
+    compiled: list[tuple[int, CompiledProgram]] = []
+    for submission_id, source in rows:
+        try:
+            compiled.append((submission_id, compile_cache.compile(source)))
+        except CompilerException as e:
+            graded.append((submission_id, ProgramResults(False, 0, 0, f"Error parsing code: {e}",
+                                                         Termination.COMPILE_ERROR)))
+    batch_results = run_batch([program for _, program in compiled], board, challenge_name, PLAYER_NAME, step_budget)
+    graded.extend((submission_id, results) for (submission_id, _), results in zip(compiled, batch_results))
+    return graded
+
+
+def _selection(name_column: str, guild_id: int | None, names: list[str] | None) -> tuple[str, list]:
+    """WHERE clause and parameters picking the challenges of a guild and/or by name, everything by default"""
+    conditions, parameters = [], []
+    if guild_id is not None:
+        conditions.append("guild_id = ?")
+        parameters.append(guild_id)
+    if names:
+        conditions.append(f"{name_column} IN ({', '.join('?' * len(names))})")
+        parameters.extend(names)
+    if not conditions:
+        return "", parameters
+    return " WHERE " + " AND ".join(conditions), parameters
+
+
+class Regrader:
+    connection: sqlite3.Connection
+    workers: int
+    chunk_size: int
+    step_budget: int
+    batch: bool
+
+    def __init__(self,
+                 database: str,
+                 workers: int | None = None,
+                 chunk_size: int = 512,
+                 step_budget: int = Program.MAX_DURATION,
+                 batch: bool = False):
+        # The bot may be writing to the same database, wait for it rather than fail
+        self.connection = sqlite3.connect(database, timeout=30)
+        self.connection.executescript(CHALLENGE_SCHEMA)
+        self.connection.executescript(SCHEMA)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.step_budget = step_budget
+        self.batch = batch
+
+    def challenges(self, guild_id: int | None = None, names: list[str] | None = None) -> list[tuple[int, str, str]]:
+        """(guild id, name, challenge string) of the challenges to regrade, all of them by default"""
+        where, parameters = _selection("name", guild_id, names)
+        return self.connection.execute(
+            f"SELECT guild_id, name, challenge_string FROM challenges{where} ORDER BY guild_id, name", parameters
+        ).fetchall()
+
+    def checkpoint(self, guild_id: int, challenge_name: str, challenge_hash: bytes) -> int:
+        """Id of the last submission regraded against this map, 0 to start over"""
+        row = self.connection.execute(
+            "SELECT challenge_hash, last_id FROM regrade_checkpoints WHERE guild_id = ? AND challenge_name = ?",
+            (guild_id, challenge_name),
+        ).fetchone()
+        if row is None or row[0] != challenge_hash:
+            return 0
+        return row[1]
+
+    def clear_checkpoints(self, guild_id: int | None = None, names: list[str] | None = None):
+        """Forgets the checkpoints of the same challenges `challenges` selects, the others resume as before"""
+        where, parameters = _selection("challenge_name", guild_id, names)
+        with self.connection:
+            self.connection.execute(f"DELETE FROM regrade_checkpoints{where}", parameters)
+
+    def _chunks(self, guild_id: int, challenge_name: str, after_id: int) -> Iterator[list[tuple[int, str]]]:
+        # Keyset pagination: every chunk is an index range scan, however far into the table it is
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, source FROM submissions WHERE guild_id = ? AND challenge_name = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (guild_id, challenge_name, after_id, self.chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+    def _write(self, guild_id: int, challenge_name: str, challenge_hash: bytes,
+               graded: list[tuple[int, ProgramResults]]):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE submissions SET challenge_hash = ?, success = ?, termination = ?, steps = ?, duration = ?, "
+                "error = ?, regraded_at = ? WHERE id = ?",
+                ((challenge_hash, results.success, results.termination, results.steps, results.duration,
+                  results.error, now, submission_id) for submission_id, results in graded),
+            )
+            # Same transaction as the results, so the checkpoint never runs ahead of what was written
+            self.connection.execute(
+                "INSERT OR REPLACE INTO regrade_checkpoints "
+                "(guild_id, challenge_name, challenge_hash, last_id, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (guild_id, challenge_name, challenge_hash, max(submission_id for submission_id, _ in graded), now),
+            )
+            publish_change(self.connection, guild_id, challenge_name)
+
+    def regrade(self, guild_id: int, challenge_name: str, challenge_string: str, pool: ProcessPoolExecutor) -> int:
+        """Regrades one challenge and returns how many submissions were graded"""
+        challenge_hash = Board.from_string(challenge_name, challenge_string).content_hash
+        after_id = self.checkpoint(guild_id, challenge_name, challenge_hash)
+        total = self.connection.execute(
+            "SELECT COUNT(*) FROM submissions WHERE guild_id = ? AND challenge_name = ? AND id > ?",
+            (guild_id, challenge_name, after_id),
+        ).fetchone()[0]
+        label = f"{guild_id}/{challenge_name}"
+        if after_id:
+            print(f"{label}: resuming after submission {after_id}", file=sys.stderr)
+        progress = Progress(total, started=time.monotonic())
+
+        # Chunks are written back in order, a few per worker in flight
+        in_flight: deque[Future] = deque()
+        for rows in self._chunks(guild_id, challenge_name, after_id):
+            in_flight.append(pool.submit(
+                regrade_chunk, challenge_name, challenge_string, rows, self.step_budget, self.batch))
+            if len(in_flight) >= self.workers * 2:
+                self._finish_chunk(guild_id, challenge_name, challenge_hash, in_flight.popleft(), progress, label)
+        while in_flight:
+            self._finish_chunk(guild_id, challenge_name, challenge_hash, in_flight.popleft(), progress, label)
+        return progress.done
+
+    def _finish_chunk(self, guild_id: int, challenge_name: str, challenge_hash: bytes, future: Future,
+                      progress: Progress, label: str):
+        graded = future.result()
+        self._write(guild_id, challenge_name, challenge_hash, graded)
+        progress.done += len(graded)
+        progress.report(label)
+
+    def run(self, guild_id: int | None = None, names: list[str] | None = None) -> int:
+        started = time.monotonic()
+        graded = 0
+        with ProcessPoolExecutor(self.workers) as pool:
+            for challenge_guild, challenge_name, challenge_string in self.challenges(guild_id, names):
+                graded += self.regrade(challenge_guild, challenge_name, challenge_string, pool)
+        elapsed = time.monotonic() - started
+        print(f"Regraded {graded} submissions in {elapsed:.1f}s ({graded / max(elapsed, 1e-9):,.0f}/s)",
+              file=sys.stderr)
+        return graded
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(prog="python -m game.regrade",
+                                         description="Regrade stored submissions against the current maps")
+    arg_parser.add_argument("-d", "--database", default="robot.db")
+    arg_parser.add_argument("-g", "--guild", type=int, default=None, help="only the challenges of this guild")
+    arg_parser.add_argument("-c", "--challenge", action="append", help="challenge to regrade, can be repeated")
+    arg_parser.add_argument("--all", action="store_true", help="regrade every challenge")
+    arg_parser.add_argument("--restart", action="store_true",
+                            help="ignore the checkpoints of previous runs for the selected challenges")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, defaults to CPUs")
+    arg_parser.add_argument("--chunk-size", type=int, default=512)
+    arg_parser.add_argument("--step-budget", type=int, default=Program.MAX_DURATION)
+    arg_parser.add_argument("--batch", action="store_true", help="grade with the NumPy engine, needs NumPy")
+    args = arg_parser.parse_args(argv)
+    if not args.all and not args.challenge and args.guild is None:
+        arg_parser.error("pick challenges with --challenge or --guild, or pass --all")
+
+    regrader = Regrader(args.database, args.workers, args.chunk_size, args.step_budget, args.batch)
+    try:
+        if args.restart:
+            regrader.clear_checkpoints(args.guild, args.challenge)
+        regrader.run(args.guild, args.challenge)
+    finally:
+        regrader.close()
+
+
+if __name__ == "__main__":
+    main()
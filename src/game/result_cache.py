@@ -0,0 +1,64 @@
+import dataclasses
+from collections import OrderedDict
+
+from game.coding.program import Program, ProgramResults, Termination
+
+
+class ResultCache:
+    """Results of finished runs by (board content hash, program fingerprint).
+
+    The interpreter is deterministic for a board and a program, so an identical resubmission gets the stored results
+    without running anything. Only the flavour text of running out of steps depends on the player, it is rolled again
+    on every hit.
+    """
+    results: OrderedDict[tuple[bytes, bytes], ProgramResults]
+    keys_by_challenge: dict[bytes, set[tuple[bytes, bytes]]]
+    max_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int = 4096):
+        self.results = OrderedDict()
+        self.keys_by_challenge = {}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, challenge_hash: bytes, program_hash: bytes, player_name: str) -> ProgramResults | None:
+        key = (challenge_hash, program_hash)
+        results = self.results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.results.move_to_end(key)
+        if results.termination == Termination.OUT_OF_STEPS:
+            return dataclasses.replace(results, error=Program.out_of_steps_message(player_name))
+        return dataclasses.replace(results)
+
+    def put(self, challenge_hash: bytes, program_hash: bytes, results: ProgramResults):
+        if results.termination == Termination.OUT_OF_TIME:
+            # Depends on how busy the machine was, not on the program
+            return
+
+        key = (challenge_hash, program_hash)
+        self.results[key] = dataclasses.replace(results)
+        self.results.move_to_end(key)
+        self.keys_by_challenge.setdefault(challenge_hash, set()).add(key)
+        while len(self.results) > self.max_size:
+            self._forget(self.results.popitem(last=False)[0])
+
+    def invalidate(self, challenge_hash: bytes):
+        for key in self.keys_by_challenge.pop(challenge_hash, ()):
+            self.results.pop(key, None)
+
+    def _forget(self, key: tuple[bytes, bytes]):
+        keys = self.keys_by_challenge.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_challenge[key[0]]
+
+    def stats(self) -> dict:
+        return {"size": len(self.results), "hits": self.hits, "misses": self.misses}
@@ -1,11 +1,18 @@
 from dataclasses import dataclass
-from typing import Tuple
-
-from discord.user import User
+from functools import cached_property
+from typing import Hashable, Tuple
 
 from game.board import Board
 from game.exceptions import RobotException
-from game.tile import Tile
+from game.tile import VOID, WALL
+
+
+class Cause:
+    """Why a robot error stopped a program"""
+    VOID = "void"
+    WALL = "wall"
+    PICK_UP = "pick_up"
+    DROP = "drop"
 
 
 @dataclass
@@ -13,33 +20,32 @@ class RobotEntity:
     board: Board
     current_position: Tuple[int, int]
     has_object: bool
-    sensor_up: Tile | None
-    sensor_down: Tile | None
-    sensor_left: Tile | None
-    sensor_right: Tile | None
+    sensor_up: int
+    sensor_down: int
+    sensor_left: int
+    sensor_right: int
+    """Sensors hold the tile code of the neighbouring cells"""
 
     def __init__(self, board: Board):
         self.board = board
         self.current_position = board.start_position
         self.has_object = False
-        self.sensor_up = None
-        self.sensor_down = None
-        self.sensor_left = None
-        self.sensor_right = None
+        self.update_sensors()
 
     def update_sensors(self):
-        self.sensor_up = self.board.get_tile(self.current_position[0], self.current_position[1] - 1)
-        self.sensor_down = self.board.get_tile(self.current_position[0], self.current_position[1] + 1)
-        self.sensor_left = self.board.get_tile(self.current_position[0] - 1, self.current_position[1])
-        self.sensor_right = self.board.get_tile(self.current_position[0] + 1, self.current_position[1])
+        x, y = self.current_position
+        self.sensor_up = self.board.get_code(x, y - 1)
+        self.sensor_down = self.board.get_code(x, y + 1)
+        self.sensor_left = self.board.get_code(x - 1, y)
+        self.sensor_right = self.board.get_code(x + 1, y)
 
     def self_evaluate(self, step: int):
-        current_tile = self.board.get_tile(self.current_position[0], self.current_position[1])
+        current_tile = self.board.get_code(self.current_position[0], self.current_position[1])
 
-        if current_tile.tile_type.string_value == "VOID":
-            raise RobotException(step, "We lost contact with the robot. It fell into the void.")
-        if current_tile.tile_type.string_value == "WALL":
-            raise RobotException(step, "We lost contact with the robot. It hit a wall.")
+        if current_tile == VOID:
+            raise RobotException(step, "We lost contact with the robot. It fell into the void.", Cause.VOID)
+        if current_tile == WALL:
+            raise RobotException(step, "We lost contact with the robot. It hit a wall.", Cause.WALL)
 
     def move_in_direction(self, x_direction: int, y_direction: int):
         position_x = self.current_position[0]
@@ -52,15 +58,15 @@ class RobotEntity:
 
 
 class RobotGame:
-    discord_user_id: User
+    player_id: Hashable
     board: Board
     robot: RobotEntity
     challenge_name: str
     object_in_drop_zone: bool = False
     robot_in_finish_zone: bool = False
 
-    def __init__(self, discord_user_id: User, board: Board, robot: RobotEntity, challenge_name: str):
-        self.discord_user_id = discord_user_id
+    def __init__(self, player_id: Hashable, board: Board, robot: RobotEntity, challenge_name: str):
+        self.player_id = player_id
         self.board = board
         self.robot = robot
         self.challenge_name = challenge_name
@@ -72,24 +78,32 @@ class RobotGame:
 
 class RobotChallenge:
     name: str
-    players: list[User] = []
-    challenge_string: str
-    initial_map: str
-    games: list[RobotGame] = []
-
-    def __init__(self, name: str, challenge_string: str):
+    board: Board
+    optimal_steps: int | None
+    """Steps of the shortest possible solution, None until the map has been solved"""
+
+    def __init__(self,
+                 name: str,
+                 challenge_string: str | None = None,
+                 optimal_steps: int | None = None,
+                 board: Board | None = None):
+        """Either `challenge_string` or `board`, the challenge string already parsed, e.g. while it was streamed in"""
         self.name = name
-        self.challenge_string = challenge_string
-        self.initial_map = Board.from_string(name, challenge_string).get_emojis()
-
-    async def add_player(self, player: User) -> RobotGame:
-        self.players.append(player)
-        board = Board.from_string(self.name, self.challenge_string)
-        robot = RobotEntity(board)
-        game = RobotGame(player, board, robot, self.name)
-        self.games.append(game)
-        return game
-
-    async def remove_player(self, player: User):
-        self.players.remove(player)
-        self.games = [game for game in self.games if game.discord_user_id != player.id]
+        self.optimal_steps = optimal_steps
+        # Parsed and validated once, every game shares this board and only keeps its own robot and progress. The
+        # string isn't kept, a mostly void map takes far less memory as a sparse board
+        self.board = board or Board.from_string(name, challenge_string)
+
+    @property
+    def challenge_string(self) -> str:
+        return self.board.to_string()
+
+    @cached_property
+    def initial_map(self) -> str:
+        # Rendered on demand, the emojis of a large map take far more memory than its board
+        return self.board.get_emojis()
+
+    async def add_player(self, player: Hashable) -> RobotGame:
+        """A fresh game on this challenge. The challenge doesn't keep it, games are tracked by the SessionManager"""
+        robot = RobotEntity(self.board)
+        return RobotGame(player, self.board, robot, self.name)
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from game.exceptions import SubmissionRejectedException
+
+
+@dataclass
+class Job:
+    guild_id: int
+    user_id: int
+    run: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated_at: float
+
+
+class SubmissionScheduler:
+    """Admission control and fair ordering between the cog and the engine.
+
+    Queued jobs are kept per guild and per user, and workers take them round robin: one job from the next guild,
+    from that guild's next user. A guild full of spammers can only ever take its turn, and so can a single user.
+    """
+    concurrency: int
+    max_queued: int
+    max_per_user: int
+    rate: float
+    burst: int
+    queues: OrderedDict[int, OrderedDict[int, deque[Job]]]
+    active_by_user: dict[int, int]
+    buckets: dict[int, TokenBucket]
+    waits: deque[float]
+    queued: int
+    in_flight: int
+    rejected: int
+    completed: int
+    on_wait: Callable[[float], None] | None
+    """Called with the seconds every job waited in the queue, when a worker takes it"""
+
+    def __init__(self,
+                 concurrency: int,
+                 max_queued: int = 256,
+                 max_per_user: int = 2,
+                 rate: float = 0.5,
+                 burst: int = 5,
+                 on_wait: Callable[[float], None] | None = None):
+        """`rate` is the number of submissions a user is allowed per second on average, `burst` how many at once"""
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.rate = rate
+        self.burst = burst
+        self.queues = OrderedDict()
+        self.active_by_user = {}
+        self.buckets = {}
+        self.waits = deque(maxlen=1000)
+        self.queued = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.on_wait = on_wait
+        self._wake = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    async def submit(self, guild_id: int, user_id: int, run: Callable[[], Awaitable[Any]]) -> Any:
+        self._admit(user_id)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+        job = Job(guild_id, user_id, run, asyncio.get_running_loop().create_future())
+        self.queues.setdefault(guild_id, OrderedDict()).setdefault(user_id, deque()).append(job)
+        self.queued += 1
+        self.active_by_user[user_id] = self.active_by_user.get(user_id, 0) + 1
+        self._wake.set()
+        return await job.future
+
+    def _admit(self, user_id: int):
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            raise SubmissionRejectedException("The robot has too many solutions to try right now")
+        if self.active_by_user.get(user_id, 0) >= self.max_per_user:
+            self.rejected += 1
+            raise SubmissionRejectedException("You already have solutions waiting for the robot")
+
+        now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(self.burst, now)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+        bucket.updated_at = now
+        if bucket.tokens < 1:
+            self.rejected += 1
+            raise SubmissionRejectedException("You are sending solutions too fast")
+        bucket.tokens -= 1
+
+        if len(self.buckets) > 10_000:
+            # Users whose bucket has refilled are indistinguishable from new users
+            self.buckets = {
+                user: bucket for user, bucket in self.buckets.items()
+                if bucket.tokens + (now - bucket.updated_at) * self.rate < self.burst
+            }
+
+    def _next_job(self) -> Job:
+        guild_id, users = self.queues.popitem(last=False)
+        user_id, jobs = users.popitem(last=False)
+        job = jobs.popleft()
+        # Whoever was served goes to the back of the line
+        if jobs:
+            users[user_id] = jobs
+        if users:
+            self.queues[guild_id] = users
+        self.queued -= 1
+        return job
+
+    async def _work(self):
+        while True:
+            while not self.queues:
+                self._wake.clear()
+                await self._wake.wait()
+
+            job = self._next_job()
+            wait = time.monotonic() - job.enqueued_at
+            self.waits.append(wait)
+            if self.on_wait is not None:
+                self.on_wait(wait)
+            self.in_flight += 1
+            try:
+                # The submitter may have given up while the job was waiting
+                if not job.future.cancelled():
+                    result = await job.run()
+                    if not job.future.done():
+                        job.future.set_result(result)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                self.completed += 1
+                self.active_by_user[job.user_id] -= 1
+                if not self.active_by_user[job.user_id]:
+                    del self.active_by_user[job.user_id]
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p99": waits[min(len(waits) - 1, len(waits) * 99 // 100)] if waits else 0.0,
+        }
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,111 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable
+
+from game.robot_game import RobotChallenge, RobotGame
+
+SessionKey = tuple[int, str, Hashable]
+"""(guild id, challenge name, player id)"""
+
+
+@dataclass
+class Session:
+    game: RobotGame
+    last_used: float = field(default_factory=time.monotonic)
+    finished: bool = False
+
+    def size_in_bytes(self) -> int:
+        """What the session keeps alive on its own. The board is shared by every game of the challenge and not
+        counted"""
+        game, robot = self.game, self.game.robot
+        return sum(sys.getsizeof(o) for o in (self, self.__dict__, game, game.__dict__, robot, robot.__dict__))
+
+
+class SessionManager:
+    """Games being played, at most one per player and challenge.
+
+    Sessions are dropped once they've been idle for `ttl` seconds, finished ones after `finished_ttl`. When
+    `max_sessions` are open, the least recently used one makes room for the next.
+    """
+    sessions: OrderedDict[SessionKey, Session]
+    max_sessions: int
+    ttl: float
+    finished_ttl: float
+    sweep_interval: float
+    last_sweep: float
+    expired: int
+    evicted: int
+
+    def __init__(self,
+                 max_sessions: int = 1000,
+                 ttl: float = 600.0,
+                 finished_ttl: float = 60.0,
+                 sweep_interval: float = 5.0):
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+        self.expired = 0
+        self.evicted = 0
+
+    async def open(self, guild_id: int, challenge: RobotChallenge, player: Hashable) -> RobotGame:
+        """Starts a new game for the player, replacing the one they had on this challenge"""
+        now = time.monotonic()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        key = (guild_id, challenge.name, player)
+        self.sessions.pop(key, None)
+        while len(self.sessions) >= self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+
+        game = await challenge.add_player(player)
+        self.sessions[key] = Session(game, now)
+        return game
+
+    def get(self, guild_id: int, challenge_name: str, player: Hashable) -> RobotGame | None:
+        key = (guild_id, challenge_name, player)
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(key)
+        return session.game
+
+    def finish(self, guild_id: int, challenge_name: str, player: Hashable):
+        session = self.sessions.get((guild_id, challenge_name, player))
+        if session is not None:
+            session.finished = True
+            session.last_used = time.monotonic()
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drops the expired sessions, returns how many"""
+        now = time.monotonic() if now is None else now
+        self.last_sweep = now
+        expired = [
+            key for key, session in self.sessions.items()
+            if now - session.last_used >= (self.finished_ttl if session.finished else self.ttl)
+        ]
+        for key in expired:
+            del self.sessions[key]
+        self.expired += len(expired)
+        return len(expired)
+
+    def memory(self) -> dict[SessionKey, int]:
+        return {key: session.size_in_bytes() for key, session in self.sessions.items()}
+
+    def stats(self) -> dict:
+        sizes = self.memory().values()
+        return {
+            "sessions": len(self.sessions),
+            "finished": sum(session.finished for session in self.sessions.values()),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "bytes": sum(sizes),
+            "largest_bytes": max(sizes, default=0),
+        }
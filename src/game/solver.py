@@ -0,0 +1,117 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Tuple
+
+from game.board import Board
+from game.exceptions import UnsolvableChallengeException
+from game.tile import TILE_TYPES, VOID, WALL
+
+# 1 for every tile code the robot survives on. The robot is lost on VOID and WALL, see RobotEntity.self_evaluate
+_WALKABLE = bytes(0 if code in (VOID, WALL) else 1 for code in range(len(TILE_TYPES))) + bytes(256 - len(TILE_TYPES))
+UNREACHABLE = -1
+
+
+class DistanceField:
+    """Shortest number of moves from one source cell to every other cell of a board"""
+    width: int
+    distances: array
+    """Distances on the board padded with one cell of void on every side, UNREACHABLE where the robot can't go"""
+
+    def __init__(self, width: int, distances: array):
+        self.width = width
+        self.distances = distances
+
+    def to(self, position: Tuple[int, int]) -> int:
+        return self.distances[(position[1] + 1) * (self.width + 2) + position[0] + 1]
+
+
+def distance_field(board: Board, source: Tuple[int, int]) -> DistanceField:
+    """Breadth first search over the cells of the board, one frontier per distance"""
+    padded_width = board.width + 2
+    # Walkable cells, padded with a border of void so neighbours never need a bounds check. Cells are set to 0 once
+    # visited, which makes this the visited set as well
+    open_cells = bytearray(padded_width)
+    for y in range(board.height):
+        open_cells += b"\0" + board.row(y).translate(_WALKABLE) + b"\0"
+    open_cells += bytes(padded_width)
+
+    distances = array("i", [UNREACHABLE]) * len(open_cells)
+    start = (source[1] + 1) * padded_width + source[0] + 1
+    if not open_cells[start]:
+        return DistanceField(board.width, distances)
+
+    open_cells[start] = 0
+    distances[start] = 0
+    frontier = [start]
+    distance = 0
+    offsets = (-padded_width, 1, padded_width, -1)
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for cell in frontier:
+            for offset in offsets:
+                neighbour = cell + offset
+                if open_cells[neighbour]:
+                    open_cells[neighbour] = 0
+                    distances[neighbour] = distance
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+
+    return DistanceField(board.width, distances)
+
+
+class Solver:
+    """Shortest solutions of boards. Distance fields are kept per board, so solving a board again is free.
+
+    Boards can be solved from several threads at once, e.g. large ones away from the event loop.
+    """
+    fields: OrderedDict[tuple[bytes, Tuple[int, int]], DistanceField]
+    max_fields: int
+
+    def __init__(self, max_fields: int = 32):
+        self.fields = OrderedDict()
+        self.max_fields = max_fields
+        # Only guards the cache, the searches themselves run unlocked
+        self._lock = Lock()
+
+    def distances_from(self, board: Board, source: Tuple[int, int]) -> DistanceField:
+        key = (board.content_hash, source)
+        with self._lock:
+            field = self.fields.get(key)
+            if field is not None:
+                self.fields.move_to_end(key)
+                return field
+        field = distance_field(board, source)
+        with self._lock:
+            self.fields[key] = field
+            self.fields.move_to_end(key)
+            while len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        return field
+
+    def minimum_steps(self, challenge_name: str, board: Board) -> int:
+        """Fewest steps any program needs: walk to the object, pick it up, walk to the drop zone, drop it, walk to the
+        finish. Raises UnsolvableChallengeException when one of those can't be done."""
+        for position, tile in (
+                (board.object_initial_position, "object"),
+                (board.object_drop_zone_position, "drop zone"),
+                (board.finish_position, "finish"),
+        ):
+            if position is None:
+                raise UnsolvableChallengeException(challenge_name, f"there is no {tile}")
+
+        # Moves are reversible, so two searches cover the three legs
+        from_object = self.distances_from(board, board.object_initial_position)
+        from_finish = self.distances_from(board, board.finish_position)
+        legs = (
+            ("the object can't be reached from the start", from_object.to(board.start_position)),
+            ("the drop zone can't be reached with the object", from_object.to(board.object_drop_zone_position)),
+            ("the finish can't be reached from the drop zone", from_finish.to(board.object_drop_zone_position)),
+        )
+        for reason, moves in legs:
+            if moves == UNREACHABLE:
+                raise UnsolvableChallengeException(challenge_name, reason)
+
+        # Plus one step to pick the object up and one to drop it
+        return sum(moves for _, moves in legs) + 2
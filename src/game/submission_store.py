@@ -0,0 +1,211 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from bisect import insort
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, field
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    challenge_name TEXT NOT NULL,
+    challenge_hash BLOB NOT NULL,
+    user_id INTEGER NOT NULL,
+    player_name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    termination TEXT NOT NULL,
+    steps INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    program_length INTEGER NOT NULL,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    regraded_at REAL
+);
+CREATE INDEX IF NOT EXISTS submissions_challenge ON submissions (guild_id, challenge_name, id);
+CREATE INDEX IF NOT EXISTS submissions_leaderboard
+    ON submissions (guild_id, challenge_name, challenge_hash, duration, program_length) WHERE success;
+"""
+COLUMNS = ("guild_id, challenge_name, challenge_hash, user_id, player_name, source, success, termination, steps, "
+           "duration, program_length, error, submitted_at")
+
+
+@dataclass
+class Submission:
+    guild_id: int
+    challenge_name: str
+    challenge_hash: bytes
+    """Content hash of the board the program ran on, scores of an updated map don't mix with the old ones"""
+    user_id: int
+    player_name: str
+    source: str
+    success: bool
+    termination: str
+    steps: int
+    duration: int
+    program_length: int
+    error: str | None = None
+    submitted_at: float = field(default_factory=time.time)
+
+    @property
+    def rank(self) -> tuple[int, int, float]:
+        # Fewest steps wins, then the shortest program, then whoever got there first
+        return self.duration, self.program_length, self.submitted_at
+
+
+class Leaderboard:
+    """Best successful submission of the top `size` players, kept sorted so reading it is O(size)"""
+    size: int
+    entries: list[Submission]
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = []
+
+    def offer(self, submission: Submission):
+        if not submission.success:
+            return
+        for i, entry in enumerate(self.entries):
+            if entry.user_id == submission.user_id:
+                if entry.rank <= submission.rank:
+                    return
+                del self.entries[i]
+                break
+        if len(self.entries) >= self.size and submission.rank >= self.entries[-1].rank:
+            return
+        insort(self.entries, submission, key=lambda entry: entry.rank)
+        del self.entries[self.size:]
+
+
+class SubmissionStore:
+    """Every submission ever made, appended to SQLite in WAL mode.
+
+    `record` only queues the submission and updates the in-memory leaderboards. A background task writes the queue in
+    batches from a thread, one transaction per batch, so the event loop never waits on the disk.
+    """
+    connection: sqlite3.Connection
+    pending: list[Submission]
+    writing: list[Submission]
+    leaderboards: OrderedDict[tuple[int, str, bytes], Leaderboard]
+    leaderboard_size: int
+    max_leaderboards: int
+    flush_interval: float
+    batch_size: int
+    written: int
+
+    def __init__(self,
+                 path: str = ":memory:",
+                 leaderboard_size: int = 10,
+                 max_leaderboards: int = 1024,
+                 flush_interval: float = 0.5,
+                 batch_size: int = 1000):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # A crash can only lose the last transactions, never corrupt the database
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.writing = []
+        self.leaderboards = OrderedDict()
+        self.leaderboard_size = leaderboard_size
+        self.max_leaderboards = max_leaderboards
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        self._wake = asyncio.Event()
+        self._flushing = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+
+    def _migrate(self):
+        columns = {column for _, column, *_ in self.connection.execute("PRAGMA table_info(submissions)")}
+        if "regraded_at" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE submissions ADD COLUMN regraded_at REAL")
+
+    def record(self, submission: Submission):
+        self.pending.append(submission)
+        leaderboard = self.leaderboards.get((submission.guild_id, submission.challenge_name, submission.challenge_hash))
+        if leaderboard is not None:
+            leaderboard.offer(submission)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_forever())
+        self._wake.set()
+
+    async def leaderboard(self, guild_id: int, challenge_name: str, challenge_hash: bytes) -> list[Submission]:
+        key = (guild_id, challenge_name, challenge_hash)
+        leaderboard = self.leaderboards.get(key)
+        if leaderboard is None:
+            # Registered before loading, so submissions recorded meanwhile aren't missed. Whatever hasn't reached the
+            # database yet is offered from the queues, a submission offered twice only counts once per player
+            leaderboard = self.leaderboards[key] = Leaderboard(self.leaderboard_size)
+            unwritten = self.writing + self.pending
+            for submission in await asyncio.to_thread(self._read_top, key):
+                leaderboard.offer(submission)
+            for submission in unwritten:
+                if (submission.guild_id, submission.challenge_name, submission.challenge_hash) == key:
+                    leaderboard.offer(submission)
+            while len(self.leaderboards) > self.max_leaderboards:
+                self.leaderboards.popitem(last=False)
+        self.leaderboards.move_to_end(key)
+        return list(leaderboard.entries)
+
+    def drop_leaderboards(self, guild_id: int, challenge_name: str):
+        """Forgets the leaderboards of a challenge, e.g. after its submissions were regraded. They are loaded again
+        from the database when they are next asked for"""
+        for key in [key for key in self.leaderboards if key[:2] == (guild_id, challenge_name)]:
+            del self.leaderboards[key]
+
+    def _read_top(self, key: tuple[int, str, bytes]) -> list[Submission]:
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {COLUMNS} FROM ("
+                f"  SELECT *, ROW_NUMBER() OVER ("
+                f"    PARTITION BY user_id ORDER BY duration, program_length, submitted_at"
+                f"  ) AS player_rank"
+                f"  FROM submissions WHERE guild_id = ? AND challenge_name = ? AND challenge_hash = ? AND success"
+                f") WHERE player_rank = 1 ORDER BY duration, program_length, submitted_at LIMIT ?",
+                (*key, self.leaderboard_size),
+            ).fetchall()
+        return [Submission(*row) for row in rows]
+
+    def _write(self, batch: list[Submission]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO submissions ({COLUMNS}) VALUES ({', '.join('?' * 13)})",
+                (astuple(submission) for submission in batch),
+            )
+
+    async def flush(self):
+        async with self._flushing:
+            while self.pending:
+                self.writing, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                try:
+                    await asyncio.to_thread(self._write, self.writing)
+                    self.written += len(self.writing)
+                finally:
+                    self.writing = []
+
+    async def _flush_forever(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            # Let a burst of submissions pile up into one transaction
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                # The batch is lost, later ones still get their chance
+                print(f"Unable to save submissions: {e}")
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        with self.lock:
+            self.connection.close()
@@ -1,11 +1,23 @@
 from typing import Dict
 
+# Integer tile codes, this is what boards store for every cell
+VOID = 0
+WALL = 1
+FLOOR = 2
+ROBOT = 3
+START = 4
+FINISH = 5
+OBJECT = 6
+DROP_ZONE = 7
+
 
 class TileType:
+    code: int
     string_value: str
     emoji: str
 
-    def __init__(self, string_value: str, emoji: str):
+    def __init__(self, code: int, string_value: str, emoji: str):
+        self.code = code
         self.string_value = string_value
         self.emoji = emoji
 
@@ -17,16 +29,20 @@ class TileType:
 
 
 TILES: Dict[str, TileType] = {
-    "0": TileType("VOID", "🕳️"),
-    "1": TileType("WALL", "🟦"),
-    "2": TileType("FLOOR", "⬜"),
-    "r": TileType("ROBOT", "🤖"),
-    "s": TileType("START", "🤖"),
-    "f": TileType("FINISH", "🏁"),
-    "o": TileType("OBJECT", "📦"),
-    "d": TileType("DROP_ZONE", "🎯"),
+    "0": TileType(VOID, "VOID", "🕳️"),
+    "1": TileType(WALL, "WALL", "🟦"),
+    "2": TileType(FLOOR, "FLOOR", "⬜"),
+    "r": TileType(ROBOT, "ROBOT", "🤖"),
+    "s": TileType(START, "START", "🤖"),
+    "f": TileType(FINISH, "FINISH", "🏁"),
+    "o": TileType(OBJECT, "OBJECT", "📦"),
+    "d": TileType(DROP_ZONE, "DROP_ZONE", "🎯"),
 }
 
+# Tile types indexed by their code, so a code from a board is turned into its type in O(1)
+TILE_TYPES: tuple[TileType, ...] = tuple(sorted(TILES.values(), key=lambda tile_type: tile_type.code))
+TILE_TYPES_BY_NAME: Dict[str, TileType] = {tile_type.string_value: tile_type for tile_type in TILE_TYPES}
+
 
 class Tile:
     position_x: int
@@ -45,4 +61,4 @@ class Tile:
         return f"Tile({self.position_x}, {self.position_y}, {self.tile_type})"
 
     def __repr__(self):
-        return f"Tile({self.position_x}, {self.position_y}, {self.tile_type})"
\ No newline at end of file
+        return f"Tile({self.position_x}, {self.position_y}, {self.tile_type})"
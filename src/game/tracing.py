@@ -0,0 +1,111 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Callable, Iterator, TextIO
+
+
+class TraceLevel(IntEnum):
+    OFF = 0
+    SUMMARY = 1
+    """One record per program and per submission, with opcode counters and phase timings"""
+    STEP = 2
+    """One record per executed instruction. Only for chasing a single bad run, it is as slow as the old prints"""
+
+
+class Tracer:
+    """Collects structured trace records. Every record is a flat, JSON serializable dict with a `kind` key.
+
+    The interpreter resolves the level once per run, a disabled tracer costs a single `is None` check per step.
+    """
+    level: TraceLevel
+    records: deque[dict]
+    sink: Callable[[dict], None] | None
+    trace_memory: bool
+
+    def __init__(self,
+                 level: TraceLevel = TraceLevel.OFF,
+                 sink: Callable[[dict], None] | None = None,
+                 max_records: int = 10_000,
+                 trace_memory: bool = False):
+        self.level = level
+        self.sink = sink
+        self.records = deque(maxlen=max_records)
+        self.trace_memory = trace_memory
+        if trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def enabled(self, level: TraceLevel = TraceLevel.SUMMARY) -> bool:
+        return self.level >= level
+
+    def emit(self, kind: str, **fields):
+        record = {"kind": kind, "time": time.time(), **fields}
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+
+    def extend(self, records: list[dict]):
+        """Adds records produced somewhere else, e.g. by a worker process"""
+        for record in records:
+            self.records.append(record)
+            if self.sink is not None:
+                self.sink(record)
+
+    def export(self) -> list[dict]:
+        return list(self.records)
+
+    def snapshot_memory(self, label: str, limit: int = 10):
+        if not self.trace_memory or not self.enabled():
+            return
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        self.emit(
+            "memory",
+            label=label,
+            current_bytes=current,
+            peak_bytes=peak,
+            top=[{"location": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in top],
+        )
+
+    def submission(self, **fields) -> 'SubmissionTimer':
+        return SubmissionTimer(self, fields)
+
+
+class SubmissionTimer:
+    """Times the phases of one submission (parse, build_board, execute, reply) and emits them as one record"""
+    tracer: Tracer
+    fields: dict
+    phases: dict[str, float]
+
+    def __init__(self, tracer: Tracer, fields: dict):
+        self.tracer = tracer
+        self.fields = fields
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self, **fields):
+        if self.tracer.enabled():
+            self.tracer.emit("submission", **self.fields, **fields, phases=self.phases)
+        self.tracer.snapshot_memory("submission")
+
+
+def jsonl_sink(file: TextIO) -> Callable[[dict], None]:
+    import json
+
+    def write(record: dict):
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+
+    return write
@@ -1,14 +1,76 @@
+import time
+import types
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DispatchStats:
+    """Counters of one or more events. Events can share one to be counted together"""
+    dispatches: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+    """Seconds from trigger to the last subscriber being done, of the latest dispatches"""
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "dispatches": self.dispatches,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
 class AsyncEvent:
-    def __init__(self):
-        self.subscribers = set()
+    """Calls every subscriber concurrently on trigger.
+
+    A subscriber that fails or takes longer than `timeout` seconds doesn't hold back or abort the others. Subscribers
+    are weakly referenced, subscribing doesn't keep an object (or the object of a bound method) alive. A lambda
+    nobody else holds is gone right away.
+    """
+    timeout: float
+    stats: DispatchStats
+
+    def __init__(self, timeout: float = 10.0, stats: DispatchStats | None = None):
+        self.subscribers: set[weakref.ref] = set()
+        self.timeout = timeout
+        self.stats = stats or DispatchStats()
+
+    def _ref(self, subscriber: callable, callback=None) -> weakref.ref:
+        if isinstance(subscriber, types.MethodType):
+            return weakref.WeakMethod(subscriber, callback)
+        return weakref.ref(subscriber, callback)
 
     def subscribe(self, subscriber: callable):
-        self.subscribers.add(subscriber)
+        self.subscribers.add(self._ref(subscriber, self.subscribers.discard))
 
     def unsubscribe(self, subscriber: callable):
-        self.subscribers.remove(subscriber)
+        self.subscribers.remove(self._ref(subscriber))
 
     async def trigger(self, *args, **kwargs):
-        print(f"Triggering event with {len(self.subscribers)} subscribers")
-        for subscriber in self.subscribers:
-            await subscriber(*args, **kwargs)
+        # asyncio is only imported once something is triggered, it is the slowest import of the engine by far
+        import asyncio
+
+        subscribers = [subscriber for subscriber in (ref() for ref in list(self.subscribers)) if subscriber is not None]
+        if not subscribers:
+            return
+        started = time.perf_counter()
+        await asyncio.gather(*(self._call(subscriber, args, kwargs) for subscriber in subscribers))
+        self.stats.dispatches += 1
+        self.stats.latencies.append(time.perf_counter() - started)
+
+    async def _call(self, subscriber: callable, args: tuple, kwargs: dict):
+        import asyncio
+
+        try:
+            await asyncio.wait_for(subscriber(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            print(f"Event subscriber {subscriber.__qualname__} timed out after {self.timeout}s")
+        except Exception as e:
+            self.stats.errors += 1
+            print(f"Event subscriber {subscriber.__qualname__} failed: {e!r}")
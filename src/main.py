@@ -1,11 +1,44 @@
 import asyncio
 import os
 
-from bot.robotbot import RobotBot
+from bot.robotbot import RobotBot, ShardedRobotBot
+from game.tracing import TraceLevel, Tracer, jsonl_sink
+
+
+def make_tracer() -> Tracer:
+    level = TraceLevel[os.getenv("ROBOT_TRACE_LEVEL", "OFF").upper()]
+    trace_file = os.getenv("ROBOT_TRACE_FILE")
+    return Tracer(
+        level,
+        sink=jsonl_sink(open(trace_file, "a")) if trace_file else None,
+        trace_memory=os.getenv("ROBOT_TRACE_MEMORY") == "1",
+    )
+
+
+def make_bot() -> RobotBot:
+    workers = os.getenv("ROBOT_WORKERS")
+    metrics_port = os.getenv("ROBOT_METRICS_PORT")
+    options = dict(
+        database=os.getenv("ROBOT_DATABASE", "robot.db"),
+        workers=int(workers) if workers else None,
+        max_pending_solutions=int(os.getenv("ROBOT_MAX_PENDING_SOLUTIONS", 64)),
+        tracer=make_tracer(),
+        metrics_port=int(metrics_port) if metrics_port else None,
+    )
+    # e.g. ROBOT_SHARD_COUNT=4 and ROBOT_SHARD_IDS=0,1 in one process, ROBOT_SHARD_IDS=2,3 in another
+    shard_count = os.getenv("ROBOT_SHARD_COUNT")
+    shard_ids = os.getenv("ROBOT_SHARD_IDS")
+    if shard_count is None and shard_ids is None:
+        return RobotBot(**options)
+    return ShardedRobotBot(
+        shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+        shard_count=int(shard_count) if shard_count else None,
+        **options,
+    )
 
 
 async def main(bot_token: str):
-    bot = RobotBot()
+    bot = make_bot()
     await bot.start(bot_token)
 
 if __name__ == "__main__":
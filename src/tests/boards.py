@@ -0,0 +1,18 @@
+import random
+
+
+def make_board(width: int, height: int, seed: int = 0) -> str:
+    """A walled rectangle of floor with a few holes, with the start, object, drop zone and finish on the edges."""
+    rng = random.Random(seed)
+    rows = []
+    for y in range(height):
+        if y == 0 or y == height - 1:
+            rows.append(["1"] * width)
+            continue
+        rows.append(["1"] + ["0" if rng.random() < 0.05 else "2" for _ in range(width - 2)] + ["1"])
+
+    rows[1][1] = "s"
+    rows[1][width - 2] = "o"
+    rows[height - 2][width - 2] = "d"
+    rows[height - 2][1] = "f"
+    return "\n".join("".join(row) for row in rows)
@@ -0,0 +1,67 @@
+"""
+The NumPy engine must give the same results as the interpreter, program for program. Needs NumPy.
+
+    python -m pytest
+"""
+import dataclasses
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from game.board import Board
+from game.coding.batch import run_batch
+from game.coding.program import CompiledProgram, Parser, Program, ProgramResults, Termination
+from game.exceptions import CompilerException
+from game.robot_game import RobotEntity, RobotGame
+from tests.boards import make_board
+
+COMMANDS = ("UP", "DOWN", "LEFT", "RIGHT", "PICK_UP", "DROP", "NOOP", "GOTO {target}",
+            "GOTO {target} IF SENSOR {sensor} IS {tile}")
+SENSORS = ("UP", "DOWN", "LEFT", "RIGHT")
+TILES = ("WALL", "VOID", "FLOOR", "OBJECT", "DROP_ZONE")
+BOARDS = (
+    "1111111\n1s2o2d1\n1222f21\n1111111",
+    "s2o\n0d2\n22f",
+    "0s0\n2o2\n0df",
+    "s20\no0d\n2f2",
+    make_board(12, 7, seed=3),
+)
+PROGRAMS_PER_BOARD = 1500
+
+
+def random_programs(count: int, seed: int) -> list[CompiledProgram]:
+    rng = random.Random(seed)
+    programs = []
+    while len(programs) < count:
+        length = rng.randint(1, 12)
+        lines = []
+        for line in range(1, length + 1):
+            command = rng.choice(COMMANDS).format(
+                target=rng.randint(1, length), sensor=rng.choice(SENSORS), tile=rng.choice(TILES))
+            lines.append(f"{line} {command}")
+        try:
+            programs.append(CompiledProgram.from_source(Parser("\n".join(lines)).parse()))
+        except CompilerException:
+            pass
+    return programs
+
+
+def comparable(results: ProgramResults) -> ProgramResults:
+    # Running out of steps picks a random farewell message
+    if results.termination == Termination.OUT_OF_STEPS:
+        return dataclasses.replace(results, error=None)
+    return results
+
+
+@pytest.mark.parametrize("detect_loops", (True, False))
+@pytest.mark.parametrize("board_index", range(len(BOARDS)))
+def test_batch_matches_interpreter(board_index: int, detect_loops: bool):
+    board = Board.from_string("fuzz", BOARDS[board_index])
+    programs = random_programs(PROGRAMS_PER_BOARD, seed=board_index)
+    batch = run_batch(programs, board, "fuzz", "player", step_budget=500, detect_loops=detect_loops)
+    for compiled, results in zip(programs, batch):
+        game = RobotGame("player", board, RobotEntity(board), "fuzz")
+        expected = Program(compiled, None).run(game, "player", step_budget=500, detect_loops=detect_loops)
+        assert comparable(results) == comparable(expected), "\n".join(map(str, compiled.instructions))
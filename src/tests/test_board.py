@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from game.board import Board
+from game.exceptions import RaggedBoardException, UnknownTileValueException
+
+
+def dotted_map(width: int, height: int, every: int) -> str:
+    """The start and then a floor tile every `every` cells, void everywhere else"""
+    cells = ["2" if index % every == 0 else "0" for index in range(width * height)]
+    cells[0] = "s"
+    return "\n".join("".join(cells[y * width:(y + 1) * width]) for y in range(height))
+
+
+def test_mostly_void_map_is_sparse():
+    board = Board.from_string("void", dotted_map(1000, 50, 5000))
+    assert board.sparse is not None
+    assert board.cells == b""
+
+
+def test_many_small_runs_stay_dense():
+    # 94% void, but the runs of one tile every 18 cells cost more than the cells they save
+    board = Board.from_string("dotted", dotted_map(1000, 50, 18))
+    assert board.sparse is None
+
+
+def test_sparse_board_matches_its_map():
+    string = dotted_map(1000, 50, 777)
+    board = Board.from_string("void", string)
+    assert board.sparse is not None
+    assert board.to_string() == string
+    assert board.content_hash == Board.from_lines("void", string.split("\n")).content_hash
+    for y, row in enumerate(string.split("\n")):
+        for x, tile in enumerate(row):
+            assert board.get_tile(x, y).tile_type.code == {"s": 4, "2": 2, "0": 0}[tile]
+
+
+def test_blank_row_inside_an_uploaded_map_is_ragged():
+    with pytest.raises(RaggedBoardException):
+        Board.from_lines("upload", io.BytesIO(b"s2f\n\n222"), rectangular=True)
+    # Blank lines around the map are fine
+    board = Board.from_lines("upload", io.BytesIO(b"\ns2f\r\n222\r\n\n"), rectangular=True)
+    assert board.to_string() == "s2f\n222"
+
+
+@pytest.mark.parametrize("row, tile", ((b"s2\xf0\x9f\xa4\x96", "🤖"), (b"s2\xc3\xa9", "é"), (b"s2x", "x")))
+def test_unknown_tile_of_an_upload_is_named(row: bytes, tile: str):
+    with pytest.raises(UnknownTileValueException, match=f"unknown tile value {tile}$"):
+        Board.from_lines("upload", io.BytesIO(row), rectangular=True)
@@ -0,0 +1,32 @@
+import asyncio
+import sqlite3
+import time
+
+from game.challenge_store import ChallengeStore
+from game.robot_game import RobotChallenge
+
+
+def test_waiting_for_the_write_lock_leaves_the_loop_running(tmp_path):
+    database = str(tmp_path / "robot.db")
+
+    async def scenario():
+        store = ChallengeStore(database)
+        # Another process in the middle of a write
+        other = sqlite3.connect(database, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        adding = asyncio.create_task(store.add(1, RobotChallenge("level", "s2o2d2f")))
+
+        started = time.monotonic()
+        await asyncio.sleep(0.2)
+        # The loop kept going while the store waited for the lock
+        assert time.monotonic() - started < 1
+        assert not adding.done()
+
+        other.execute("COMMIT")
+        await adding
+        other.close()
+        challenge = await store.get(1, "level")
+        store.close()
+        return challenge
+
+    assert asyncio.run(scenario()).board.width == 7
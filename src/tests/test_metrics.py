@@ -0,0 +1,30 @@
+import pytest
+
+from game.metrics import Metric, Registry
+
+
+def test_exposition():
+    registry = Registry()
+    registry.counter("runs_total", "Runs", ("outcome",)).labels("win").inc(2)
+    registry.histogram("wait_seconds", "Waits", buckets=(0.1, 1.0)).observe(0.5)
+    registry.gauge("queued", "Queued", lambda: 3)
+    assert registry.exposition().splitlines() == [
+        "# HELP runs_total Runs",
+        "# TYPE runs_total counter",
+        'runs_total{outcome="win"} 2',
+        "# HELP wait_seconds Waits",
+        "# TYPE wait_seconds histogram",
+        'wait_seconds_bucket{le="0.1"} 0',
+        'wait_seconds_bucket{le="1"} 1',
+        'wait_seconds_bucket{le="+Inf"} 1',
+        "wait_seconds_sum 0.5",
+        "wait_seconds_count 1",
+        "# HELP queued Queued",
+        "# TYPE queued gauge",
+        "queued 3",
+    ]
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("metric", "Not a kind of metric")
@@ -0,0 +1,73 @@
+import pytest
+
+from game.board import Board
+from game.coding.commands import GoToIfSensorCommand
+from game.coding.program import CompiledProgram, Parser, Program, ProgramResults, Termination
+from game.exceptions import CompilerErrorsException, EmptyProgramException
+from game.robot_game import Cause, RobotEntity, RobotGame
+
+
+def run(source: str, challenge_string: str, **options) -> ProgramResults:
+    board = Board.from_string("test", challenge_string)
+    program = Program(CompiledProgram.from_source(Parser(source).parse()), None)
+    return program.run(RobotGame("player", board, RobotEntity(board), "test"), "player", **options)
+
+
+def test_compile_errors_are_capped():
+    source = "\n".join(f"{line} GOTO 999" for line in range(1, 200))
+    with pytest.raises(CompilerErrorsException) as raised:
+        CompiledProgram.from_source(Parser(source).parse())
+    assert len(raised.value.errors) == 199
+    message = str(raised.value)
+    assert message.count("non-existent line 999") == CompilerErrorsException.max_listed
+    assert f"...and {199 - CompilerErrorsException.max_listed} more" in message
+    assert len(message) < 2000
+
+
+@pytest.mark.parametrize("source", ("", "// only a comment\n\n"))
+def test_empty_program_has_no_line_number(source: str):
+    with pytest.raises(EmptyProgramException) as raised:
+        CompiledProgram.from_source(Parser(source).parse())
+    assert str(raised.value) == "Unable to compile program. The program is empty"
+
+
+def test_goto_if_sensor_arguments_are_parsed():
+    [line] = Parser("1 GOTO 3 IF SENSOR RIGHT IS WALL").parse()
+    command = line.command
+    assert isinstance(command, GoToIfSensorCommand)
+    assert (command.next_pc, command.sensor, command.tile_type) == (3, "RIGHT", "WALL")
+
+
+@pytest.mark.parametrize("sensor, jumps", (("RIGHT", True), ("DOWN", False)))
+def test_goto_if_sensor_jumps_on_what_the_sensor_sees(sensor: str, jumps: bool):
+    # A wall to the right of the start, floor below it
+    results = run(f"1 GOTO 3 IF SENSOR {sensor} IS WALL\n2 RIGHT\n3 NOOP", "s1\n2f")
+    if jumps:
+        assert (results.termination, results.duration, results.error) == \
+               (Termination.FINISHED, 2, Program.UNFINISHED_MESSAGE)
+    else:
+        assert (results.termination, results.cause) == (Termination.ROBOT_ERROR, Cause.WALL)
+
+
+def test_loop_is_stopped_when_its_state_repeats():
+    results = run("1 NOOP\n2 GOTO 1", "s2f")
+    assert results.termination == Termination.LOOP
+    assert results.error == Program.loop_message(1, 2)
+    assert results.duration == 4
+
+
+def test_loop_runs_out_of_steps_without_detection():
+    results = run("1 NOOP\n2 GOTO 1", "s2f", step_budget=500, detect_loops=False)
+    assert (results.termination, results.duration) == (Termination.OUT_OF_STEPS, 500)
+
+
+def test_long_walk_is_not_a_loop():
+    # Sweeps a 40x40 room row by row until it walks into the wall below the last row, far more steps than the
+    # 1000 programs used to be allowed, without ever coming back to the same state
+    rows = ["1" * 42] + ["1" + "2" * 40 + "1" for _ in range(40)] + ["1" * 42]
+    rows[1] = "1s" + "2" * 39 + "1"
+    source = ("1 RIGHT\n2 GOTO 1 IF SENSOR RIGHT IS FLOOR\n3 DOWN\n"
+              "4 LEFT\n5 GOTO 4 IF SENSOR LEFT IS FLOOR\n6 DOWN\n7 GOTO 1")
+    results = run(source, "\n".join(rows))
+    assert (results.termination, results.cause) == (Termination.ROBOT_ERROR, Cause.WALL)
+    assert 1000 < results.duration < Program.MAX_DURATION
@@ -0,0 +1,35 @@
+import asyncio
+
+from game.challenge_store import ChallengeStore
+from game.coding.program import ProgramResults
+from game.regrade import Regrader
+from game.robot_game import RobotChallenge
+from game.submission_store import Submission, SubmissionStore
+
+
+def test_regrade_reaches_running_bots(tmp_path):
+    database = str(tmp_path / "robot.db")
+    challenge = RobotChallenge("level", "s2o2d2f")
+    challenge_hash = challenge.board.content_hash
+
+    async def scenario():
+        challenges = ChallengeStore(database)
+        await challenges.add(1, challenge)
+        submissions = SubmissionStore(database)
+        submissions.record(Submission(1, "level", challenge_hash, 7, "player", "1 RIGHT", False, "finished", 1, 1, 1))
+        await submissions.flush()
+        assert await submissions.leaderboard(1, "level", challenge_hash) == []
+
+        regrader = Regrader(database)
+        regrader._write(1, "level", challenge_hash, [(1, ProgramResults(True, 1, 1))])
+        regrader.close()
+
+        # What the bot does when it polls the changes
+        assert [(guild, name) for guild, name, _ in await challenges.changes()] == [(1, "level")]
+        submissions.drop_leaderboards(1, "level")
+        leaderboard = await submissions.leaderboard(1, "level", challenge_hash)
+        await submissions.close()
+        challenges.close()
+        return leaderboard
+
+    assert [entry.user_id for entry in asyncio.run(scenario())] == [7]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from game.exceptions import SubmissionRejectedException
+from game.scheduler import SubmissionScheduler
+
+
+def test_jobs_are_taken_round_robin():
+    async def scenario():
+        scheduler = SubmissionScheduler(concurrency=1, max_per_user=3, burst=10)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name: str):
+            async def run():
+                order.append(name)
+                if name == "a1":
+                    await gate.wait()
+                return name
+            return run
+
+        # a1 keeps the only worker busy while the others queue up
+        submissions = [asyncio.create_task(scheduler.submit(1, 10, job("a1")))]
+        while not order:
+            await asyncio.sleep(0)
+        for guild, user, name in ((1, 10, "a2"), (1, 10, "a3"), (1, 20, "b1"), (2, 30, "c1")):
+            submissions.append(asyncio.create_task(scheduler.submit(guild, user, job(name))))
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*submissions)
+        await scheduler.close()
+        return order, results
+
+    order, results = asyncio.run(scenario())
+    # Guilds take turns, and so do the users of a guild
+    assert order == ["a1", "a2", "c1", "b1", "a3"]
+    assert results == ["a1", "a2", "a3", "b1", "c1"]
+
+
+def test_user_with_too_many_waiting_solutions_is_rejected():
+    async def scenario():
+        scheduler = SubmissionScheduler(concurrency=1, max_per_user=2, burst=10)
+        gate = asyncio.Event()
+        submissions = [asyncio.create_task(scheduler.submit(1, 10, gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(SubmissionRejectedException, match="already have solutions waiting"):
+            await scheduler.submit(1, 10, gate.wait)
+        # Somebody else still gets in
+        submissions.append(asyncio.create_task(scheduler.submit(1, 20, gate.wait)))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(*submissions)
+        rejected = scheduler.rejected
+        await scheduler.close()
+        return rejected
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_user_sending_too_fast_is_rejected():
+    async def scenario():
+        # No refill to speak of during the test, only the burst is allowed
+        scheduler = SubmissionScheduler(concurrency=1, rate=0.001, burst=3)
+
+        async def job():
+            return None
+
+        for _ in range(3):
+            await scheduler.submit(1, 10, job)
+        with pytest.raises(SubmissionRejectedException, match="too fast"):
+            await scheduler.submit(1, 10, job)
+        await scheduler.submit(1, 20, job)
+        await scheduler.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""
+Solver.minimum_steps against a breadth-first search over every state of the game, moving with the game's own commands.
+"""
+import random
+from collections import deque
+
+import pytest
+
+from game.board import Board
+from game.coding.commands import DropCommand, MoveDownCommand, MoveLeftCommand, MoveRightCommand, MoveUpCommand, \
+    PickUpCommand
+from game.exceptions import UnsolvableChallengeException
+from game.robot_game import RobotEntity, RobotGame
+from game.solver import Solver
+
+COMMANDS = tuple(command(1) for command in (MoveUpCommand, MoveDownCommand, MoveLeftCommand, MoveRightCommand,
+                                            PickUpCommand, DropCommand))
+
+
+def brute_force(board: Board) -> int | None:
+    """Fewest instructions after which the game is won, None if it can't be"""
+    start = (board.start_position, False, False, False)
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        position, has_object, delivered, in_finish = state
+        if delivered and in_finish:
+            return distances[state]
+        for command in COMMANDS:
+            game = RobotGame("player", board, RobotEntity(board), "test")
+            game.robot.current_position = position
+            game.robot.has_object = has_object
+            game.object_in_drop_zone = delivered
+            game.robot_in_finish_zone = in_finish
+            if command.execute(game).should_terminate_program:
+                continue
+            following = (game.robot.current_position, game.robot.has_object, game.object_in_drop_zone,
+                         game.robot_in_finish_zone)
+            if following not in distances:
+                distances[following] = distances[state] + 1
+                queue.append(following)
+    return None
+
+
+def random_board(rng: random.Random) -> str:
+    width, height = rng.randint(2, 6), rng.randint(2, 6)
+    cells = [rng.choice("0122") for _ in range(width * height)]
+    for tile, index in zip("sodf", rng.sample(range(width * height), 4)):
+        cells[index] = tile
+    return "\n".join("".join(cells[y * width:(y + 1) * width]) for y in range(height))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_minimum_steps_matches_brute_force(seed: int):
+    rng = random.Random(seed)
+    solver = Solver()
+    for _ in range(150):
+        challenge_string = random_board(rng)
+        board = Board.from_string("test", challenge_string)
+        expected = brute_force(board)
+        if expected is None:
+            with pytest.raises(UnsolvableChallengeException):
+                solver.minimum_steps("test", board)
+        else:
+            assert solver.minimum_steps("test", board) == expected, challenge_string
+
+
+def test_missing_tile_is_unsolvable():
+    with pytest.raises(UnsolvableChallengeException, match="there is no drop zone"):
+        Solver().minimum_steps("test", Board.from_string("test", "so2f"))
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from game.coding.trace import MOVES, TraceRecorder, TraceState
+
+
+def random_run(steps: int, seed: int) -> tuple[TraceRecorder, list[TraceState]]:
+    """A recorder fed a random walk, and the state after every step of it"""
+    rng = random.Random(seed)
+    position, has_object, delivered = (500, 500), False, False
+    recorder = TraceRecorder(position, program_length=20)
+    expected = [TraceState(0, None, position, has_object, delivered)]
+    for step in range(1, steps + 1):
+        dx, dy = rng.choice(MOVES)
+        position = (position[0] + dx, position[1] + dy)
+        if has_object and rng.random() < 0.1:
+            has_object = False
+            delivered = delivered or rng.random() < 0.5
+        elif not has_object and rng.random() < 0.1:
+            has_object = True
+        pc = rng.randrange(20)
+        recorder.record(pc, position, has_object, delivered)
+        expected.append(TraceState(step, pc, position, has_object, delivered))
+    return recorder, expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_state_at_every_step(seed: int):
+    steps = TraceRecorder.KEYFRAME_INTERVAL * 3 + 17
+    recorder, expected = random_run(steps, seed)
+    assert len(recorder) == steps
+    for step in range(steps + 1):
+        assert recorder.state_at(step) == expected[step]
+
+
+def test_state_at_keyframe_boundaries():
+    interval = TraceRecorder.KEYFRAME_INTERVAL
+    recorder, expected = random_run(interval * 2, seed=7)
+    for step in (interval - 1, interval, interval + 1, 2 * interval):
+        assert recorder.state_at(step) == expected[step]
+
+
+def test_state_at_outside_of_the_run():
+    recorder, _ = random_run(10, seed=0)
+    with pytest.raises(IndexError):
+        recorder.state_at(11)